@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Solve many maps with several solvers and parameters in parallel.
+
+usage: python batch_solver.py maps/normal/*.bmp -g 0.9 0.99 -e 0.001 -o results.csv
+"""
+
+import os
+import csv
+import time
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+import kuimaze
+from compiled_mdp import CachedProblem
+from mdp_agent import find_policy_via_value_iteration, find_policy_via_policy_iteration, \
+    find_policy_via_prioritized_sweeping
+
+PROBS = [0.8, 0.1, 0.1, 0]
+GRAD = (0, 0)
+SOLVERS = {
+    'value_iteration': (find_policy_via_value_iteration, 'sweeps'),
+    'policy_iteration': (find_policy_via_policy_iteration, 'rounds'),
+    'prioritized_sweeping': (find_policy_via_prioritized_sweeping, 'backups'),
+}
+RESULT_FIELDS = ['map', 'solver', 'discount_factor', 'epsilon', 'iterations', 'compile_time', 'solve_time']
+
+problems = {}   # map path -> CachedProblem, every worker process compiles each map only once
+
+
+def setup_arg_parser():
+    parser = argparse.ArgumentParser(description='Solve MDP mazes for a grid of solvers and parameters.')
+    parser.add_argument('maps', nargs='+', help='paths to the map images')
+    parser.add_argument('-s', '--solvers', nargs='+', choices=list(SOLVERS), default=list(SOLVERS),
+                        help='solvers to run')
+    parser.add_argument('-g', '--discount-factors', nargs='+', type=float, default=[0.9],
+                        help='discount factors to try')
+    parser.add_argument('-e', '--epsilons', nargs='+', type=float, default=[0.001],
+                        help='epsilons to try, policy iteration does not use them')
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count(), help='number of worker processes')
+    parser.add_argument('-o', metavar='filepath', default='results.csv',
+                        help='path (including the filename) of the output .csv file with the results')
+    return parser
+
+
+def get_problem(map_path):
+    """
+    :return: (CachedProblem of the map, time spent by its compilation in this call)
+    """
+    if map_path in problems:
+        return problems[map_path], 0.0
+    start_time = time.perf_counter()
+    problem = CachedProblem(kuimaze.MDPMaze(map_image=map_path, probs=PROBS, grad=GRAD, node_rewards=None))
+    problem.get_compiled()
+    problems[map_path] = problem
+    return problem, time.perf_counter() - start_time
+
+
+def solve(job):
+    """
+    :param job: (map path, solver name, discount factor, epsilon)
+    :return: (row of the results table as dictionary, policy)
+    """
+    map_path, solver, discount_factor, epsilon = job
+    problem, compile_time = get_problem(map_path)
+    solver_function, iterations_key = SOLVERS[solver]
+    stats = {}
+    start_time = time.perf_counter()
+    if solver == 'policy_iteration':
+        policy = solver_function(problem, discount_factor, stats=stats)
+    else:
+        policy = solver_function(problem, discount_factor, epsilon, stats=stats)
+    solve_time = time.perf_counter() - start_time
+    row = {'map': map_path, 'solver': solver, 'discount_factor': discount_factor, 'epsilon': epsilon,
+           'iterations': stats[iterations_key], 'compile_time': compile_time, 'solve_time': solve_time}
+    return row, policy
+
+
+def get_jobs(maps, solvers, discount_factors, epsilons):
+    """
+    :return: list of (map path, solver name, discount factor, epsilon), grouped by maps
+    """
+    jobs = []
+    for map_path, solver, discount_factor in itertools.product(maps, solvers, discount_factors):
+        if solver == 'policy_iteration':
+            jobs.append((map_path, solver, discount_factor, None))
+        else:
+            jobs.extend((map_path, solver, discount_factor, epsilon) for epsilon in epsilons)
+    return jobs
+
+
+def run_batch(jobs, workers=None):
+    """
+    Solves the jobs in a pool of worker processes
+    :return: list of (row of the results table as dictionary, policy) in order of the jobs
+    """
+    if workers == 1:
+        return [solve(job) for job in jobs]
+    workers = workers or os.cpu_count()
+    # jobs are grouped by maps, so chunks of neighbouring jobs mostly reuse the problem compiled by the worker
+    chunksize = max(1, len(jobs) // (4 * workers))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(solve, jobs, chunksize=chunksize))
+
+
+def main():
+    parser = setup_arg_parser()
+    args = parser.parse_args()
+    jobs = get_jobs(args.maps, args.solvers, args.discount_factors, args.epsilons)
+
+    start_time = time.perf_counter()
+    results = run_batch(jobs, args.workers)
+    print('%d jobs solved in %.3f s' % (len(jobs), time.perf_counter() - start_time))
+
+    with open(args.o, 'w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=RESULT_FIELDS)
+        writer.writeheader()
+        for row, _ in results:
+            writer.writerow(row)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Benchmark of synchronous value iteration against prioritized sweeping over all bundled maps.
+
+usage: python benchmark.py [maps_root]
+"""
+
+import os
+import sys
+import time
+import kuimaze
+from mdp_agent import find_policy_via_value_iteration, find_policy_via_prioritized_sweeping
+from compiled_mdp import CachedProblem
+
+MAP_DIRS = ['maps', 'maps_difficult']
+MAP_EXTENSIONS = ('.bmp', '.png')
+PROBS = [0.8, 0.1, 0.1, 0]
+GRAD = (0, 0)
+DISCOUNT_FACTOR = 0.9
+EPSILON = 0.0001
+
+
+def list_maps(root):
+    """
+    :return: sorted list of all map images in MAP_DIRS under root
+    """
+    maps = []
+    for map_dir in MAP_DIRS:
+        for dirpath, _, filenames in os.walk(os.path.join(root, map_dir)):
+            for filename in filenames:
+                if filename.lower().endswith(MAP_EXTENSIONS):
+                    maps.append(os.path.join(dirpath, filename))
+    return sorted(maps)
+
+
+def run_solver(solver, problem):
+    """
+    :return: (policy, number of backups, wall time in seconds)
+    """
+    stats = {}
+    start_time = time.perf_counter()
+    policy = solver(problem, DISCOUNT_FACTOR, EPSILON, stats=stats)
+    return policy, stats['backups'], time.perf_counter() - start_time
+
+
+def main():
+    root = sys.argv[1] if len(sys.argv) > 1 else os.path.dirname(os.path.abspath(__file__))
+    print('%-40s %12s %12s %14s %10s %14s %10s' % ('map', 'compile [s]', 'transitions', 'sync backups', 'time [s]',
+                                                   'async backups', 'time [s]'))
+    for map_path in list_maps(root):
+        problem = CachedProblem(kuimaze.MDPMaze(map_image=map_path, probs=PROBS, grad=GRAD, node_rewards=None))
+        start_time = time.perf_counter()
+        problem.get_compiled()      # both solvers share one compiled problem
+        compile_time = time.perf_counter() - start_time
+        _, sync_backups, sync_time = run_solver(find_policy_via_value_iteration, problem)
+        _, async_backups, async_time = run_solver(find_policy_via_prioritized_sweeping, problem)
+        print('%-40s %12.3f %12d %14d %10.3f %14d %10.3f' % (os.path.relpath(map_path, root), compile_time,
+                                                             problem.misses, sync_backups, sync_time,
+                                                             async_backups, async_time))
+
+
+if __name__ == '__main__':
+    main()
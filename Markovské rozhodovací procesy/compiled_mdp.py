@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+
+import numpy as np
+
+
+class CachedProblem:
+    """
+    Wrapper of a problem which asks it only once for everything the solvers need.
+    States, their rewards, goal flags and actions are read when the wrapper is created,
+    transitions of every (state, action) pair on their first request.
+    """
+
+    def __init__(self, problem):
+        """
+        :param problem: problem - object, for us it will be kuimaze.Maze object
+        """
+        self.problem = problem
+        self.states = list(problem.get_all_states())
+        self.index = {state: i for i, state in enumerate(self.states)}
+        self.rewards = [problem.get_reward(state) for state in self.states]
+        self.goals = [problem.is_goal_state(state) for state in self.states]
+        self.actions = [list(problem.get_actions(state)) for state in self.states]
+        self.action_index = [{action: a for a, action in enumerate(actions)} for actions in self.actions]
+        self.offsets = [0]      # transitions of state s and its a-th action are at offsets[s] + a
+        for actions in self.actions:
+            self.offsets.append(self.offsets[-1] + len(actions))
+        self.transitions = [None] * self.offsets[-1]
+        self.hits = 0           # transition requests served from the table
+        self.misses = 0         # transition requests passed to the problem
+        self.compiled = None
+
+    def __getattr__(self, name):
+        # everything else (rendering, ...) is served by the wrapped problem
+        if name == 'problem':   # not set yet, e.g. while unpickling
+            raise AttributeError(name)
+        return getattr(self.problem, name)
+
+    def get_all_states(self):
+        return self.states
+
+    def get_actions(self, state):
+        return self.actions[self.index[state]]
+
+    def get_reward(self, state):
+        return self.rewards[self.index[state]]
+
+    def is_goal_state(self, state):
+        return self.goals[self.index[state]]
+
+    def get_next_states_and_probs(self, state, action):
+        s = self.index[state]
+        pair = self.offsets[s] + self.action_index[s][action]
+        transitions = self.transitions[pair]
+        if transitions is None:
+            self.misses += 1
+            transitions = self.transitions[pair] = list(self.problem.get_next_states_and_probs(state, action))
+        else:
+            self.hits += 1
+        return transitions
+
+    def get_compiled(self):
+        """
+        :return: CompiledMDP of the problem, compiled only on the first call
+        """
+        if self.compiled is None:
+            self.compiled = CompiledMDP(self)
+        return self.compiled
+
+
+def compile_problem(problem):
+    """
+    :param problem: problem - object or CachedProblem wrapping it, pass the same CachedProblem
+                    to several solvers to compile the problem only once
+    :return: CompiledMDP of the problem
+    """
+    if not isinstance(problem, CachedProblem):
+        problem = CachedProblem(problem)
+    return problem.get_compiled()
+
+
+class CompiledMDP:
+    """
+    MDP problem compiled into NumPy arrays, states and actions are replaced by their indices.
+    Transitions are stored as a sparse COO matrix of shape (states * actions, states):
+    the entry k moves from row rows[k] = state * num_actions + action to the state cols[k]
+    with probability probs[k].
+    """
+
+    def __init__(self, problem):
+        """
+        :param problem: problem - object, for us it will be kuimaze.Maze object
+        """
+        self.states = list(problem.get_all_states())
+        self.index = {state: i for i, state in enumerate(self.states)}
+        self.num_states = len(self.states)
+
+        state_actions = [[] if problem.is_goal_state(state) else list(problem.get_actions(state))
+                         for state in self.states]
+        self.actions = []
+        for actions in state_actions:
+            for action in actions:
+                if action not in self.actions:
+                    self.actions.append(action)
+        action_index = {action: a for a, action in enumerate(self.actions)}
+        self.num_actions = len(self.actions)
+
+        self.rewards = np.array([problem.get_reward(state) for state in self.states], dtype=float)
+        self.goals = np.array([problem.is_goal_state(state) for state in self.states], dtype=bool)
+        self.valid = np.zeros((self.num_states, self.num_actions), dtype=bool)  # action applicable in state
+
+        rows, cols, probs = [], [], []
+        for s, actions in enumerate(state_actions):
+            for action in actions:
+                a = action_index[action]
+                self.valid[s, a] = True
+                for next_state, prob in problem.get_next_states_and_probs(self.states[s], action):
+                    rows.append(s * self.num_actions + a)
+                    cols.append(self.index[next_state])
+                    probs.append(prob)
+        self.rows = np.array(rows, dtype=np.int64)
+        self.cols = np.array(cols, dtype=np.int64)
+        self.probs = np.array(probs, dtype=float)
+
+    def get_action_values(self, utils):
+        """
+        Expected utility of the next state for every state and action
+        :param utils: array of state utilities
+        :return: array (states, actions), -inf for actions not applicable in the state
+        """
+        values = np.bincount(self.rows, weights=self.probs * utils[self.cols],
+                             minlength=self.num_states * self.num_actions)
+        values = values.reshape(self.num_states, self.num_actions)
+        values[~self.valid] = -np.inf
+        return values
+
+    def get_policy_transitions(self, action_indices):
+        """
+        Transitions of a fixed policy, goal states have none
+        :param action_indices: array of action indices for every state
+        :return: COO matrix of shape (states, states) as (rows, cols, probs) arrays
+        """
+        states, actions = np.divmod(self.rows, self.num_actions)
+        selected = actions == action_indices[states]
+        return states[selected], self.cols[selected], self.probs[selected]
+
+    def get_state_transitions(self):
+        """
+        Transitions grouped by states, for algorithms backing up one state at a time
+        :return: list indexed by states of lists of (action index, [(next state, prob), ...])
+        """
+        transitions = [[] for _ in range(self.num_states)]
+        for row, col, prob in zip(self.rows.tolist(), self.cols.tolist(), self.probs.tolist()):
+            s, a = divmod(row, self.num_actions)
+            if not transitions[s] or transitions[s][-1][0] != a:
+                transitions[s].append((a, []))
+            transitions[s][-1][1].append((col, prob))
+        return transitions
+
+    def get_predecessors(self):
+        """
+        :return: list indexed by states of lists of states from which the state can be reached by some action
+        """
+        predecessors = [set() for _ in range(self.num_states)]
+        for row, col in zip((self.rows // max(self.num_actions, 1)).tolist(), self.cols.tolist()):
+            predecessors[col].add(row)
+        return [sorted(states) for states in predecessors]
+
+    def get_policy(self, action_indices):
+        """
+        :param action_indices: array of action indices for every state
+        :return: dictionary of policy, indexed by states, None for goal states
+        """
+        return {state: None if self.goals[s] else self.actions[action_indices[s]]
+                for s, state in enumerate(self.states)}
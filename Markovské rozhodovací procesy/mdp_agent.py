@@ -1,122 +1,191 @@
 #!/usr/bin/env python3
 
 import random
-import copy
+import time
 import math
+import heapq as hq
+import numpy as np
+from compiled_mdp import compile_problem
 
+EXACT_EVALUATION_MAX_STATES = 2000     # above this number of states the linear system is too expensive to solve
 
-def init_policy(problem):
+
+def evaluate_policy_exactly(mdp, policy, discount_factor):
     """
-    Initialize random policy
-    :param problem: problem - object, for us it will be kuimaze.Maze object
-    :return: dictionary of (random) policy, indexed by states
+    Policy evaluation by solving the linear system (I - discount_factor * P_policy) U = R,
+    goal states keep their rewards
+    :param mdp: CompiledMDP of the problem
+    :param policy: array of action indices for every state
+    :param discount_factor: determines the present value of future rewards
+    :return: array of state utilities
     """
-    policy = dict()
-    for state in problem.get_all_states():
-        if problem.is_goal_state(state):
-            policy[state] = None
-            continue
-        actions = [action for action in problem.get_actions(state)]
-        policy[state] = random.choice(actions)
-    return policy
+    rows, cols, probs = mdp.get_policy_transitions(policy)
+    system = np.eye(mdp.num_states)
+    np.add.at(system, (rows, cols), -discount_factor * probs)
+    return np.linalg.solve(system, mdp.rewards)
 
 
-def init_utils(problem):
+def evaluate_policy_iteratively(mdp, policy, discount_factor, utils, steps, tolerance):
     """
-    Initialize all state utilities to their rewards
-    :param problem: problem - object, for us it will be kuimaze.Maze object
-    :return: dictionary of utilities, indexed by states
+    Policy evaluation by repeated backups with fixed policy (modified policy iteration)
+    :param mdp: CompiledMDP of the problem
+    :param policy: array of action indices for every state
+    :param discount_factor: determines the present value of future rewards
+    :param utils: array of state utilities to start from
+    :param steps: maximal number of backups
+    :param tolerance: stop when no utility changes more than this
+    :return: array of state utilities
     """
-    utils = dict()
-    for state in problem.get_all_states():
-        utils[state] = problem.get_reward(state)
+    rows, cols, probs = mdp.get_policy_transitions(policy)
+    for _ in range(steps):
+        new_utils = mdp.rewards + discount_factor * np.bincount(rows, weights=probs * utils[cols],
+                                                                minlength=mdp.num_states)
+        delta = np.max(np.abs(new_utils - utils), initial=0)
+        utils = new_utils
+        if delta < tolerance:
+            break
     return utils
 
 
-def find_policy_via_policy_iteration(problem, discount_factor):
+def find_policy_via_policy_iteration(problem, discount_factor, evaluation='auto', steps=20, tolerance=1e-6,
+                                     stats=None):
     """
     Find optimal policy using policy iteration method
-    :param problem: problem - object, for us it will be kuimaze.Maze object
+    :param problem: problem - object, for us it will be kuimaze.Maze object, or CachedProblem wrapping it
     :param discount_factor: determines the present value of future rewards
+    :param evaluation: policy evaluation method, 'exact' solves the linear system, 'iterative' runs
+                       at most steps backups with fixed policy, 'auto' chooses by the number of states
+    :param steps: maximal number of backups of one iterative evaluation
+    :param tolerance: precision of iterative evaluation
+    :param stats: optional dictionary, filled with number of improvement 'rounds' and 'round_times' in seconds
     :return: dictionary of optimal policy, indexed by states
     """
-    base_policy = init_policy(problem)
-    utils = init_utils(problem)
+    mdp = compile_problem(problem)
+    if evaluation == 'auto':
+        evaluation = 'exact' if mdp.num_states <= EXACT_EVALUATION_MAX_STATES else 'iterative'
+    if evaluation not in ('exact', 'iterative'):
+        raise ValueError('unknown policy evaluation method: %s' % evaluation)
+    if evaluation == 'exact' and mdp.num_states > EXACT_EVALUATION_MAX_STATES:
+        raise ValueError('too many states for exact policy evaluation: %d' % mdp.num_states)
+    policy = np.array([0 if mdp.goals[s] else random.choice(np.flatnonzero(mdp.valid[s]))
+                       for s in range(mdp.num_states)], dtype=np.int64)
+    utils = mdp.rewards.copy()
+    states = np.arange(mdp.num_states)
+    round_times = []
 
     while True:
-        stable_policy = True
-        policy = copy.deepcopy(base_policy)
-        for state in problem.get_all_states():
-            if problem.is_goal_state(state):
-                continue
-
-            policy_eval = 0
-
-            action_info = problem.get_next_states_and_probs(state,policy[state])
-            for i in range(len(action_info)):
-                policy_eval += action_info[i][1] * utils[action_info[i][0]]
-
-            utils[state] = problem.get_reward(state) + discount_factor * policy_eval
-
-            max_action_value = -math.inf
-            best_action = None
-            actions = [action for action in problem.get_actions(state)]
-            for action in actions:
-                action_info = problem.get_next_states_and_probs(state, action)
-                action_value = 0
-                for i in range(len(action_info)):
-                    action_value += action_info[i][1] * utils[action_info[i][0]]
-                if action_value > max_action_value:
-                    max_action_value = action_value
-                    best_action = action
-
-            if max_action_value > policy_eval:
-                base_policy[state] = best_action
-                stable_policy = False
-
-        if stable_policy:
+        round_start = time.perf_counter()
+        if evaluation == 'exact':
+            try:
+                utils = evaluate_policy_exactly(mdp, policy, discount_factor)
+            except np.linalg.LinAlgError:   # singular system for discount_factor 1 and policies never reaching goal
+                evaluation = 'iterative'
+        if evaluation == 'iterative':
+            utils = evaluate_policy_iteratively(mdp, policy, discount_factor, utils, steps, tolerance)
+
+        # change the action only where another one is strictly better, otherwise the policy may oscillate
+        action_values = mdp.get_action_values(utils)
+        best_actions = np.argmax(action_values, axis=1)
+        improved = (action_values[states, best_actions] > action_values[states, policy] + 1e-12) & ~mdp.goals
+        policy = np.where(improved, best_actions, policy)
+        round_times.append(time.perf_counter() - round_start)
+
+        if not improved.any():
             break
-    
-    return policy
+
+    if stats is not None:
+        stats['rounds'] = len(round_times)
+        stats['round_times'] = round_times
+    return mdp.get_policy(policy)
 
 
-def find_policy_via_value_iteration(problem, discount_factor, epsilon):
+def find_policy_via_value_iteration(problem, discount_factor, epsilon, stats=None):
     """
     Find optimal policy using value iteration method
-    :param problem: problem - object, for us it will be kuimaze.Maze object
+    :param problem: problem - object, for us it will be kuimaze.Maze object, or CachedProblem wrapping it
     :param discount_factor: determines the present value of future rewards
     :param epsilon: impacts accuracy of estimation
+    :param stats: optional dictionary, filled with number of 'sweeps' and state 'backups'
     :return: dictionary of optimal policy, indexed by states
     """
-    policy = init_policy(problem)
-    utils = init_utils(problem)
+    mdp = compile_problem(problem)
+    utils = mdp.rewards.copy()
     theta = epsilon * (1 - discount_factor) / discount_factor
+    sweeps = 0
 
     while True:
-        v = copy.deepcopy(utils)
-        delta = 0
-
-        for state in problem.get_all_states():
-            if problem.is_goal_state(state):
-                policy[state] = None
-                continue
-
-            max_action_value = -math.inf
-            actions = [action for action in problem.get_actions(state)]
-            for action in actions:
-                action_info = problem.get_next_states_and_probs(state, action)
-                action_value = 0
-                for i in range(len(action_info)):
-                    action_value += action_info[i][1] * v[action_info[i][0]]
-                if action_value > max_action_value:
-                    max_action_value = action_value
-                    policy[state] = action
-
-            utils[state] = problem.get_reward(state) + discount_factor * max_action_value
-            delta = max(delta, abs(utils[state] - v[state]))
+        sweeps += 1
+        # Bellman backup of all states at once from utilities of the previous sweep
+        action_values = mdp.get_action_values(utils)
+        best_actions = np.argmax(action_values, axis=1)
+        max_action_values = np.max(action_values, axis=1)
+        new_utils = np.where(mdp.goals, mdp.rewards, mdp.rewards + discount_factor * max_action_values)
+        delta = np.max(np.abs(new_utils - utils), initial=0)
+        utils = new_utils
 
         if delta < theta:
             break
 
-    return policy
+    if stats is not None:
+        stats['sweeps'] = sweeps
+        stats['backups'] = sweeps * int(np.count_nonzero(~mdp.goals))
+    return mdp.get_policy(best_actions)
+
 
+def find_policy_via_prioritized_sweeping(problem, discount_factor, epsilon, stats=None):
+    """
+    Find optimal policy using asynchronous value iteration, states are backed up one by one in order
+    of their Bellman residuals and a backup of a state updates residuals of its predecessors
+    :param problem: problem - object, for us it will be kuimaze.Maze object, or CachedProblem wrapping it
+    :param discount_factor: determines the present value of future rewards
+    :param epsilon: impacts accuracy of estimation
+    :param stats: optional dictionary, filled with number of state 'backups'
+    :return: dictionary of optimal policy, indexed by states
+    """
+    mdp = compile_problem(problem)
+    transitions = mdp.get_state_transitions()
+    predecessors = mdp.get_predecessors()
+    rewards = mdp.rewards.tolist()
+    goals = mdp.goals.tolist()
+    utils = list(rewards)
+    theta = epsilon * (1 - discount_factor) / discount_factor
+
+    def backup(s):
+        best_value, best_action = -math.inf, 0
+        for a, next_states in transitions[s]:
+            value = 0
+            for next_state, prob in next_states:
+                value += prob * utils[next_state]
+            if value > best_value:
+                best_value, best_action = value, a
+        return rewards[s] + discount_factor * best_value, best_action
+
+    residuals = [0.0] * mdp.num_states
+    queue = []      # heap of (-residual, state)
+    for s in range(mdp.num_states):
+        if not goals[s]:
+            residuals[s] = abs(backup(s)[0] - utils[s])
+            if residuals[s] >= theta:
+                queue.append((-residuals[s], s))
+    hq.heapify(queue)
+
+    backups = 0
+    while queue:
+        residual, s = hq.heappop(queue)
+        if -residual != residuals[s]:   # stale entry, residual has changed since
+            continue
+        utils[s] = backup(s)[0]
+        residuals[s] = 0.0
+        backups += 1
+        for p in predecessors[s]:
+            if goals[p]:
+                continue
+            residual = abs(backup(p)[0] - utils[p])
+            if residual != residuals[p]:
+                residuals[p] = residual
+                if residual >= theta:
+                    hq.heappush(queue, (-residual, p))
+
+    if stats is not None:
+        stats['backups'] = backups
+    return mdp.get_policy([0 if goals[s] else backup(s)[1] for s in range(mdp.num_states)])
@@ -0,0 +1,138 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark of Q-learning throughput over all bundled maps. Policies learnt in the real environment and in its
+tabular model are compared by their mean reward in the real environment.
+
+usage: python benchmark.py [maps_root] [num_copies]
+"""
+
+import os
+import sys
+import copy
+import time
+import numpy as np
+import kuimaze
+from rl_agent import walk_randomly, walk_randomly_batched, walk_simulated, learn_policy, learn_policy_simulated, \
+    validate_policy
+from tabular_maze import TabularMaze
+
+MAP_DIRS = ['maps', 'maps_difficult']
+MAP_EXTENSIONS = ('.bmp', '.png')
+PROBS = [0.8, 0.1, 0.1, 0]
+GRAD = (0, 0)
+EPISODES = 64
+ALPHA = 0.5
+VALIDATION_EPISODES = 20
+
+
+class CountingEnv:
+    """
+    Environment wrapper counting calls of step()
+    """
+
+    def __init__(self, env):
+        self.env = env
+        self.steps = 0
+
+    def __getattr__(self, name):
+        if name == 'env':   # not set yet, e.g. while copying
+            raise AttributeError(name)
+        return getattr(self.env, name)
+
+    def step(self, action):
+        self.steps += 1
+        return self.env.step(action)
+
+
+def list_maps(root):
+    """
+    :return: sorted list of all map images in MAP_DIRS under root
+    """
+    maps = []
+    for map_dir in MAP_DIRS:
+        for dirpath, _, filenames in os.walk(os.path.join(root, map_dir)):
+            for filename in filenames:
+                if filename.lower().endswith(MAP_EXTENSIONS):
+                    maps.append(os.path.join(dirpath, filename))
+    return sorted(maps)
+
+
+def new_q_table(env):
+    x_dims = env.observation_space.spaces[0].n
+    y_dims = env.observation_space.spaces[1].n
+    return np.zeros([x_dims, y_dims, env.action_space.n], dtype=float)
+
+
+def run_loop(env):
+    """
+    :return: (number of steps, wall time in seconds) of EPISODES episodes walked one by one
+    """
+    env = CountingEnv(env)
+    q_table = new_q_table(env)
+    start_time = time.perf_counter()
+    for _ in range(EPISODES):
+        walk_randomly(env, ALPHA, q_table)
+    return env.steps, time.perf_counter() - start_time
+
+
+def run_batched(env, num_copies):
+    """
+    :return: (number of steps, wall time in seconds) of EPISODES episodes walked num_copies at once
+    """
+    envs = [env] + [copy.deepcopy(env) for _ in range(num_copies - 1)]
+    q_table = new_q_table(env)
+    steps = 0
+    start_time = time.perf_counter()
+    for _ in range(EPISODES // num_copies):
+        steps += walk_randomly_batched(envs, ALPHA, q_table)
+    return steps, time.perf_counter() - start_time
+
+
+def run_simulated(env):
+    """
+    :return: (number of steps, wall time in seconds) of EPISODES episodes walked at once in the tabular model,
+             (number of real environment steps, wall time in seconds, coverage) of learning the model
+    """
+    start_time = time.perf_counter()
+    maze = TabularMaze(env, PROBS)
+    model_time = time.perf_counter() - start_time
+    q_table = new_q_table(env)
+    start_time = time.perf_counter()
+    steps = walk_simulated(maze, ALPHA, q_table, EPISODES)
+    return (steps, time.perf_counter() - start_time), (maze.steps, model_time, maze.coverage())
+
+
+def compare_policies(env):
+    """
+    :return: mean rewards of the policies of learn_policy and learn_policy_simulated in env
+             and numbers of steps in env both of them needed
+    """
+    stats = {}
+    policy = learn_policy(env, stats=stats)
+    sim_stats = {}
+    sim_policy = learn_policy_simulated(env, probs=PROBS, stats=sim_stats)
+    return (validate_policy(env, policy, VALIDATION_EPISODES), validate_policy(env, sim_policy, VALIDATION_EPISODES),
+            stats['steps'], sim_stats['model_steps'])
+
+
+def main():
+    root = sys.argv[1] if len(sys.argv) > 1 else os.path.dirname(os.path.abspath(__file__))
+    num_copies = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    print('%-40s %10s %12s %10s %12s %10s %12s %10s %9s %8s %8s %10s %10s' % (
+        'map', 'steps', 'loop [st/s]', 'steps', 'batch [st/s]', 'steps', 'sim [st/s]', 'model [s]', 'coverage',
+        'reward', 'sim rew.', 'env steps', 'model st.'))
+    for map_path in list_maps(root):
+        env = kuimaze.HardMaze(map_image=map_path, probs=PROBS, grad=GRAD)
+        loop_steps, loop_time = run_loop(env)
+        batch_steps, batch_time = run_batched(env, num_copies)
+        (sim_steps, sim_time), (_, model_time, coverage) = run_simulated(env)
+        reward, sim_reward, env_steps, model_steps = compare_policies(env)
+        print('%-40s %10d %12.0f %10d %12.0f %10d %12.0f %10.3f %9.3f %8.3f %8.3f %10d %10d' % (
+            os.path.relpath(map_path, root), loop_steps, loop_steps / max(loop_time, 1e-9), batch_steps,
+            batch_steps / max(batch_time, 1e-9), sim_steps, sim_steps / max(sim_time, 1e-9), model_time, coverage,
+            reward, sim_reward, env_steps, model_steps))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark of episodes needed by learn_policy to converge with every exploration, with and without
+Dyna-Q planning, over all bundled maps.
+
+usage: python convergence_benchmark.py [maps_root]
+"""
+
+import os
+import sys
+import time
+import kuimaze
+from rl_agent import learn_policy, validate_policy, EXPLORATIONS
+from benchmark import list_maps, PROBS, GRAD
+
+VALIDATION_EPISODES = 20
+PLANNING_STEPS = [0, 10]
+
+
+def run_exploration(env, exploration, planning_steps):
+    """
+    :return: (number of episodes, number of steps, wall time in seconds, mean reward of the learnt policy)
+    """
+    stats = {}
+    start_time = time.perf_counter()
+    policy = learn_policy(env, exploration=exploration, planning_steps=planning_steps, stats=stats)
+    learn_time = time.perf_counter() - start_time
+    return stats['episodes'], stats['steps'], learn_time, validate_policy(env, policy, VALIDATION_EPISODES)
+
+
+def main():
+    root = sys.argv[1] if len(sys.argv) > 1 else os.path.dirname(os.path.abspath(__file__))
+    print('%-40s %-16s %9s %10s %10s %10s %10s' % ('map', 'exploration', 'planning', 'episodes', 'steps', 'time [s]',
+                                                  'reward'))
+    for map_path in list_maps(root):
+        env = kuimaze.HardMaze(map_image=map_path, probs=PROBS, grad=GRAD)
+        for exploration in EXPLORATIONS:
+            for planning_steps in PLANNING_STEPS:
+                episodes, steps, learn_time, reward = run_exploration(env, exploration, planning_steps)
+                print('%-40s %-16s %9d %10d %10d %10.3f %10.3f' % (os.path.relpath(map_path, root), exploration,
+                                                                   planning_steps, episodes, steps, learn_time,
+                                                                   reward))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+"""
+Ring buffer of experienced transitions for experience replay and Dyna-Q planning
+"""
+
+import numpy as np
+
+
+class ReplayBuffer:
+    """
+    Stores the last size transitions (state, action, reward, next state) in preallocated arrays,
+    the oldest transition is overwritten when the buffer is full.
+    """
+
+    def __init__(self, size):
+        """
+        :param size: maximal number of stored transitions
+        """
+        self.size = size
+        self.states = np.zeros((size, 2), dtype=np.uint16)
+        self.actions = np.zeros(size, dtype=np.uint8)
+        self.rewards = np.zeros(size, dtype=np.float32)
+        self.next_states = np.zeros((size, 2), dtype=np.uint16)
+        self.position = 0       # index of the next stored transition
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def add(self, state, action, reward, next_state):
+        """
+        Stores one transition
+        """
+        i = self.position
+        self.states[i] = state
+        self.actions[i] = action
+        self.rewards[i] = reward
+        self.next_states[i] = next_state
+        self.position = (i + 1) % self.size
+        self.count = min(self.count + 1, self.size)
+
+    def sample(self, n):
+        """
+        :param n: number of transitions
+        :return: (states, actions, rewards, next states) arrays of n transitions drawn uniformly with replacement
+        """
+        i = np.random.randint(self.count, size=n)
+        return self.states[i], self.actions[i], self.rewards[i], self.next_states[i]
@@ -8,14 +8,95 @@ Simple agent for finding optimal policy by Q-learning
 
 import numpy as np
 import math
+import copy
+import os
+from collections.abc import Mapping
+from tabular_maze import TabularMaze
+from replay_buffer import ReplayBuffer
 
+EXPLORATIONS = ('random', 'epsilon_greedy', 'boltzmann', 'count_bonus')
+EPSILON_DECAY = 0.99        # epsilon of epsilon-greedy exploration in episode t is EPSILON_DECAY ** t
+EPSILON_MIN = 0.05
+TEMPERATURE = 1.0           # temperature of Boltzmann exploration in episode t is TEMPERATURE * TEMPERATURE_DECAY ** t
+TEMPERATURE_DECAY = 0.98
+TEMPERATURE_MIN = 0.01
+COUNT_BONUS = 0.5           # bonus of an action tried n times in the state is COUNT_BONUS / sqrt(1 + n)
+CHECK_INTERVAL = 10         # number of episodes between convergence checks
+TD_TOLERANCE = 0.05         # mean absolute TD error of converged learning
+POLICY_TOLERANCE = 0.05     # maximal loss of Q value by following the greedy policy of the last check
+BUFFER_SIZE = 100000        # default number of transitions kept for Dyna-Q planning
 
-def walk_randomly(env, alpha, q_table):
+
+def argmax_random_ties(values):
+    """
+    :param values: array (walks, actions)
+    :return: array of indices of the maximal value in every row, ties are broken randomly
+    """
+    best = values == values.max(axis=1, keepdims=True)
+    return np.argmax(best * np.random.random(values.shape), axis=1)
+
+
+def select_actions(q_values, visits, exploration, episode):
+    """
+    Selects actions of several walks by the exploration policy
+    :param q_values: array (walks, actions) of Q values in current states of the walks
+    :param visits: array (walks, actions) of numbers of tries of the actions in current states
+    :param exploration: one of EXPLORATIONS
+    :param episode: number of the episode, the exploration decays with it
+    :return: array of actions
+    """
+    num_walks, num_actions = q_values.shape
+    if exploration == 'random':
+        return np.random.randint(num_actions, size=num_walks)
+    if exploration == 'epsilon_greedy':
+        epsilon = max(EPSILON_MIN, EPSILON_DECAY ** episode)
+        actions = argmax_random_ties(q_values)
+        explore = np.random.random(num_walks) < epsilon
+        actions[explore] = np.random.randint(num_actions, size=np.count_nonzero(explore))
+        return actions
+    if exploration == 'boltzmann':
+        temperature = max(TEMPERATURE_MIN, TEMPERATURE * TEMPERATURE_DECAY ** episode)
+        probs = np.exp((q_values - q_values.max(axis=1, keepdims=True)) / temperature)
+        cumulative = np.cumsum(probs, axis=1)
+        thresholds = np.random.random(num_walks) * cumulative[:, -1]
+        return np.minimum((cumulative < thresholds[:, None]).sum(axis=1), num_actions - 1)
+    if exploration == 'count_bonus':
+        return argmax_random_ties(q_values + COUNT_BONUS / np.sqrt(1 + visits))
+    raise ValueError('Unknown exploration %r, use one of %s' % (exploration, ', '.join(EXPLORATIONS)))
+
+
+def update_stats(stats, td_errors):
+    if stats is not None:
+        stats['td_error'] = stats.get('td_error', 0) + float(np.abs(td_errors).sum())
+        stats['updates'] = stats.get('updates', 0) + len(td_errors)
+
+
+def update_pairs(q_table, pairs, td_errors, alpha):
+    """
+    Q-learning update of many pairs of state and action at once. A pair present several times is updated once
+    by the mean of its TD errors, the sum of them would multiply the learning rate by the number of copies.
+    :param q_table: table of learnt Q values, updated in place
+    :param pairs: tuple of index arrays of the pairs to q_table
+    :param td_errors: array of TD errors of the pairs
+    :param alpha: learning rate
+    """
+    unique_pairs, inverse, counts = np.unique(np.ravel_multi_index(pairs, q_table.shape), return_inverse=True,
+                                              return_counts=True)
+    mean_td_errors = np.bincount(inverse.ravel(), weights=td_errors, minlength=len(unique_pairs)) / counts
+    q_table.flat[unique_pairs] += alpha * mean_td_errors
+
+
+def walk_randomly(env, alpha, q_table, exploration='random', episode=0, visits=None, stats=None):
     """
     Walking randomly and learning about given environment
     :param env: object, for us it will be kuimaze.Maze object
     :param alpha: learning rate
     :param q_table: initialized table for storing learnt Q values of states in environment
+    :param exploration: one of EXPLORATIONS, 'random' samples the action space of env
+    :param episode: number of the episode, the exploration decays with it
+    :param visits: table of numbers of tries of actions in states, same shape as q_table, updated if given
+    :param stats: dictionary, if given, sum of absolute TD errors and number of updates are added
+                  to its 'td_error' and 'updates'
     """
     obv = env.reset()
     state = obv[0:2]
@@ -26,7 +107,14 @@ def walk_randomly(env, alpha, q_table):
 
     while not is_done and t < MAX_T:
         t += 1
-        action = env.action_space.sample()
+        if exploration == 'random':
+            action = env.action_space.sample()
+        else:
+            action = select_actions(q_table[state[0], state[1]][None], visits[state[0], state[1]][None]
+                                    if visits is not None else np.zeros((1, q_table.shape[2])),
+                                    exploration, episode)[0]
+        if visits is not None:
+            visits[state[0], state[1], action] += 1
         obv, reward, is_done, _ = env.step(action)
         nextstate = obv[0:2]
 
@@ -35,38 +123,268 @@ def walk_randomly(env, alpha, q_table):
             value = q_table[nextstate[0]][nextstate[1]][a]
             if value > max_value:
                 max_value = value
-        q_table[state[0]][state[1]][action] += alpha * (
-                    reward + gamma * max_value - q_table[state[0]][state[1]][action])
+        td_error = reward + gamma * max_value - q_table[state[0]][state[1]][action]
+        q_table[state[0]][state[1]][action] += alpha * td_error
+        update_stats(stats, [td_error])
 
         state = nextstate
 
 
-def find_policy(q_table, maze_size):
+def replay(buffer, alpha, q_table, planning_steps, stats=None):
+    """
+    Dyna-Q planning, Q-learning updates of transitions sampled from the buffer, which serves as the model
+    of the environment
+    :param buffer: ReplayBuffer of experienced transitions
+    :param alpha: learning rate
+    :param q_table: table of learnt Q values of states in environment
+    :param planning_steps: number of replayed transitions
+    :param stats: dictionary, if given, sum of absolute TD errors and number of updates are added
+                  to its 'td_error' and 'updates'
+    """
+    gamma = 1   # discount factor
+    states, actions, rewards, next_states = buffer.sample(planning_steps)
+    x, y = states[:, 0], states[:, 1]
+    max_values = q_table[next_states[:, 0], next_states[:, 1]].max(axis=1)
+    td_errors = rewards + gamma * max_values - q_table[x, y, actions]
+    update_pairs(q_table, (x, y, actions), td_errors, alpha)
+    update_stats(stats, td_errors)
+
+
+def walk_with_planning(env, alpha, q_table, buffer, planning_steps, exploration='random', episode=0, visits=None,
+                       stats=None):
+    """
+    Walking in the environment like walk_randomly, every step is stored to the buffer and followed
+    by planning_steps replayed updates
+    :param env: object, for us it will be kuimaze.Maze object
+    :param alpha: learning rate
+    :param q_table: initialized table for storing learnt Q values of states in environment
+    :param buffer: ReplayBuffer of experienced transitions
+    :param planning_steps: number of replayed transitions after every step
+    :param exploration: one of EXPLORATIONS, 'random' samples the action space of env
+    :param episode: number of the episode, the exploration decays with it
+    :param visits: table of numbers of tries of actions in states, same shape as q_table, updated if given
+    :param stats: dictionary, if given, sum of absolute TD errors and number of updates of real steps
+                  are added to its 'td_error' and 'updates'
+    """
+    obv = env.reset()
+    state = obv[0:2]
+    is_done = False
+    gamma = 1   # discount factor
+    MAX_T = 1000  # max trials (for one episode)
+    t = 0
+
+    while not is_done and t < MAX_T:
+        t += 1
+        if exploration == 'random':
+            action = env.action_space.sample()
+        else:
+            action = select_actions(q_table[state[0], state[1]][None], visits[state[0], state[1]][None]
+                                    if visits is not None else np.zeros((1, q_table.shape[2])),
+                                    exploration, episode)[0]
+        if visits is not None:
+            visits[state[0], state[1], action] += 1
+        obv, reward, is_done, _ = env.step(action)
+        nextstate = obv[0:2]
+
+        td_error = reward + gamma * q_table[nextstate[0], nextstate[1]].max() - q_table[state[0], state[1], action]
+        q_table[state[0], state[1], action] += alpha * td_error
+        update_stats(stats, [td_error])
+
+        buffer.add(state, action, reward, nextstate)
+        if planning_steps > 0:
+            replay(buffer, alpha, q_table, planning_steps)
+
+        state = nextstate
+
+
+def walk_randomly_batched(envs, alpha, q_table, exploration='random', episode=0, visits=None, stats=None):
+    """
+    Walking randomly in several copies of the environment at once, one step in all of them per iteration
+    :param envs: list of independent copies of the environment
+    :param alpha: learning rate
+    :param q_table: initialized table for storing learnt Q values of states in environment
+    :param exploration: one of EXPLORATIONS, 'random' draws uniform actions from np.random, deep copies
+                        of the environment would repeat the same samples of their copied action spaces
+    :param episode: number of the episode, the exploration decays with it
+    :param visits: table of numbers of tries of actions in states, same shape as q_table, updated if given
+    :param stats: dictionary, if given, sum of absolute TD errors and number of updates are added
+                  to its 'td_error' and 'updates'
+    :return: number of performed steps
+    """
+    states = np.array([env.reset()[0:2] for env in envs], dtype=int)
+    active = np.arange(len(envs))      # indices of environments with unfinished episode
+    gamma = 1   # discount factor
+    MAX_T = 1000  # max trials (for one episode)
+    t = 0
+    steps = 0
+
+    while len(active) > 0 and t < MAX_T:
+        t += 1
+        x, y = states[active, 0], states[active, 1]
+        if exploration == 'random':
+            actions = np.random.randint(q_table.shape[2], size=len(active))
+        else:
+            actions = select_actions(q_table[x, y], visits[x, y] if visits is not None else np.zeros((len(x), 1)),
+                                     exploration, episode)
+        if visits is not None:
+            np.add.at(visits, (x, y, actions), 1)
+        next_states = np.empty((len(active), 2), dtype=int)
+        rewards = np.empty(len(active))
+        is_done = np.empty(len(active), dtype=bool)
+        for j, i in enumerate(active):
+            obv, rewards[j], is_done[j], _ = envs[i].step(actions[j])
+            next_states[j] = obv[0:2]
+        steps += len(active)
+
+        # TD updates of all environments at once, copies in the same state with the same action share one update
+        max_values = q_table[next_states[:, 0], next_states[:, 1]].max(axis=1)
+        td_errors = rewards + gamma * max_values - q_table[x, y, actions]
+        update_pairs(q_table, (x, y, actions), td_errors, alpha)
+        update_stats(stats, td_errors)
+
+        states[active] = next_states
+        active = active[~is_done]
+
+    return steps
+
+
+def walk_simulated(maze, alpha, q_table, num_walks):
+    """
+    Walking randomly in the tabular model of the environment, all walks are stepped at once.
+    A walk ends when it makes a move unknown to the model, that move is not updated.
+    :param maze: TabularMaze learnt from the environment
+    :param alpha: learning rate
+    :param q_table: initialized table for storing learnt Q values of states in environment
+    :param num_walks: number of walks (episodes)
+    :return: number of performed steps
+    """
+    q_values = q_table.reshape(-1, q_table.shape[2])   # view of q_table indexed by cell index
+    cells = maze.reset(num_walks)
+    gamma = 1   # discount factor
+    MAX_T = 1000  # max trials (for one episode)
+    t = 0
+    steps = 0
+
+    while len(cells) > 0 and t < MAX_T:
+        t += 1
+        actions = np.random.randint(q_values.shape[1], size=len(cells))
+        next_cells, rewards, is_done, is_known = maze.step(cells, actions)
+        cells, actions, next_cells, rewards, is_done = (cells[is_known], actions[is_known], next_cells[is_known],
+                                                        rewards[is_known], is_done[is_known])
+        steps += len(cells)
+
+        # all walks start in the same cell, walks with the same move share one update
+        td_errors = rewards + gamma * q_values[next_cells].max(axis=1) - q_values[cells, actions]
+        update_pairs(q_values, (cells, actions), td_errors, alpha)
+
+        cells = next_cells[~is_done]
+
+    return steps
+
+
+def validate_policy(env, policy, episodes=10):
+    """
+    Follows the policy in the real environment
+    :param env: object, for us it will be kuimaze.Maze object
+    :param policy: dictionary of policy, indexed by state coordinates
+    :param episodes: number of episodes
+    :return: average total reward of an episode
+    """
+    MAX_T = 1000  # max trials (for one episode)
+    total_reward = 0
+    for _ in range(episodes):
+        obv = env.reset()
+        is_done = False
+        t = 0
+        while not is_done and t < MAX_T:
+            t += 1
+            obv, reward, is_done, _ = env.step(policy[tuple(obv[0:2])])
+            total_reward += reward
+    return total_reward / episodes
+
+
+class PolicyView(Mapping):
+    """
+    Read-only dictionary of policy, indexed by state coordinates, backed by an array of actions.
+    Actions are read from the array only when they are asked for.
+    """
+
+    def __init__(self, actions):
+        """
+        :param actions: array (x, y) of actions
+        """
+        self.actions = actions
+
+    def __getitem__(self, state):
+        x, y = state
+        if not (0 <= x < self.actions.shape[0] and 0 <= y < self.actions.shape[1]):
+            raise KeyError(state)
+        return int(self.actions[x, y])
+
+    def __iter__(self):
+        for x in range(self.actions.shape[0]):
+            for y in range(self.actions.shape[1]):
+                yield x, y
+
+    def __len__(self):
+        return self.actions.size
+
+
+def find_policy(q_table, maze_size, as_array=False):
     """
     Finds optimal policy in each state of environment
     :param q_table: learnt Q values of states in environment
     :param maze_size: dimensions of environment
-    :return: dictionary of policy, indexed by state coordinates
+    :param as_array: return the array of actions instead of the dictionary
+    :return: PolicyView (dictionary of policy, indexed by state coordinates) or array (x, y) of actions
     """
-    policy = dict()
-    for x in range(maze_size[0]):
-        for y in range(maze_size[1]):
-            state = (x, y)
-            max_value = -math.inf
-            action = None
-            for a in range(4):
-                value = q_table[state[0]][state[1]][a]
-                if value > max_value:
-                    max_value = value
-                    action = a
-            policy[state] = action
-    return policy
+    actions = np.argmax(q_table[:maze_size[0], :maze_size[1]], axis=2)     # first of equal values like before
+    if as_array:
+        return actions
+    return PolicyView(actions)
+
+
+def save_q_table(q_table, path):
+    """
+    Saves the Q table as .npy file, which load_q_table maps into memory
+    :param q_table: learnt Q values of states in environment
+    :param path: path of the .npy file
+    """
+    np.save(path, q_table)
 
 
-def learn_policy(env):
+def load_q_table(path, mode='c'):
+    """
+    Maps the Q table saved by save_q_table into memory, pages are read only when they are used
+    :param path: path of the .npy file
+    :param mode: 'c' to keep changes in memory only, 'r+' to write them back to the file, 'r' for read-only table
+    :return: memory-mapped Q table
     """
-    Learn about environment and find optimal policy
+    return np.load(path, mmap_mode=mode)
+
+
+def learn_policy(env, num_copies=1, exploration='random', max_episodes=450, patience=3, tolerance=TD_TOLERANCE,
+                 policy_tolerance=POLICY_TOLERANCE, planning_steps=0, buffer_size=BUFFER_SIZE, q_table_path=None,
+                 stats=None):
+    """
+    Learn about environment and find optimal policy. Learning stops early when the greedy policy
+    is stable for patience convergence checks in a row: following the greedy policy of the previous
+    check loses at most policy_tolerance of Q value in every visited state and the mean
+    absolute TD error since the previous check is at most tolerance.
     :param env: object, for us it will be kuimaze.Maze object
+    :param num_copies: number of copies of the environment walked through at once
+    :param exploration: one of EXPLORATIONS
+    :param max_episodes: maximal number of learning episodes
+    :param patience: number of stable convergence checks to stop, None to always walk max_episodes
+    :param tolerance: maximal mean absolute TD error of converged learning
+    :param policy_tolerance: maximal loss of Q value by following the greedy policy of the previous check
+    :param planning_steps: number of Dyna-Q updates replayed from the buffer after every step in env,
+                           with more than 0 the environment copies are not used
+    :param buffer_size: maximal number of transitions in the replay buffer
+    :param q_table_path: path of .npy file with the Q table, if it exists, learning continues from the saved table
+                         with decayed learning rate and exploration, the learnt table is saved there
+    :param stats: dictionary, if given, number of walked episodes is stored to its 'episodes'
+                  and number of steps to 'steps'
     :return: dictionary of policy, indexed by state coordinates
     """
     x_dims = env.observation_space.spaces[0].n
@@ -74,15 +392,100 @@ def learn_policy(env):
     maze_size = tuple((x_dims, y_dims))
     num_actions = env.action_space.n
 
-    q_table = np.zeros([maze_size[0], maze_size[1], num_actions], dtype=float)
+    if q_table_path is not None and os.path.exists(q_table_path):
+        q_table = load_q_table(q_table_path, 'r+')
+        if q_table.shape != (maze_size[0], maze_size[1], num_actions):
+            raise ValueError('Q table in %s has shape %s, the environment needs %s'
+                             % (q_table_path, q_table.shape, (maze_size[0], maze_size[1], num_actions)))
+    else:
+        q_table = np.zeros([maze_size[0], maze_size[1], num_actions], dtype=float)
+    visits = np.zeros(q_table.shape, dtype=np.int64)
+
+    alpha = 1   # learning rate
+    k = 50
+    t = 0
+    skipped = 9 * k if isinstance(q_table, np.memmap) else 0   # saved table continues with the final alpha 0.1
+    next_check = CHECK_INTERVAL
+    stable_checks = 0
+    greedy_actions = None
+    td_stats = {}
+    if planning_steps > 0:
+        buffer = ReplayBuffer(buffer_size)
+    elif num_copies > 1:
+        envs = [env] + [copy.deepcopy(env) for _ in range(num_copies - 1)]
+    while t < max_episodes:
+        if planning_steps > 0:
+            alpha = max(0.1, k / (k + skipped + t + 1))
+            walk_with_planning(env, alpha, q_table, buffer, planning_steps, exploration, skipped + t, visits,
+                               td_stats)
+            t += 1
+        elif num_copies > 1:
+            batch = min(num_copies, max_episodes - t)   # the last batch does not walk over max_episodes
+            alpha = max(0.1, k / (k + skipped + t + batch))
+            walk_randomly_batched(envs[:batch], alpha, q_table, exploration, skipped + t, visits, td_stats)
+            t += batch          # one batch walks batch episodes
+        else:
+            alpha = max(0.1, k / (k + skipped + t + 1))
+            walk_randomly(env, alpha, q_table, exploration, skipped + t, visits, td_stats)
+            t += 1
+
+        if patience is not None and t >= next_check:
+            next_check = t + CHECK_INTERVAL
+            td_error = td_stats['td_error'] / max(td_stats['updates'], 1)
+            td_stats.clear()
+            if greedy_actions is not None:
+                visited = visits.any(axis=2)
+                loss = q_table.max(axis=2) - np.take_along_axis(q_table, greedy_actions[:, :, None], axis=2)[:, :, 0]
+                if loss[visited].max() <= policy_tolerance and td_error <= tolerance:
+                    stable_checks += 1
+                    if stable_checks >= patience:
+                        break
+                else:
+                    stable_checks = 0
+            greedy_actions = np.argmax(q_table, axis=2)
+
+    if stats is not None:
+        stats['episodes'] = t
+        stats['steps'] = int(visits.sum())
+    if isinstance(q_table, np.memmap):
+        q_table.flush()
+    elif q_table_path is not None:
+        save_q_table(q_table, q_table_path)
+    policy = find_policy(q_table, maze_size)
+    return policy
+
+
+def learn_policy_simulated(env, num_walks=64, probs=(0.8, 0.1, 0.1, 0), model_episodes=200, stats=None):
+    """
+    Learn the tabular model of the environment first and then find the policy by Q-learning in the model only.
+    The policy takes only actions known to the model. When the model never reached a terminal state,
+    the policy is learnt by learn_policy in the real environment instead.
+    :param env: object, for us it will be kuimaze.Maze object
+    :param num_walks: number of walks in the model stepped at once
+    :param probs: probabilities of (forward, left, right, backward) action confusions of env
+    :param model_episodes: maximal number of walks in env used to learn the model
+    :param stats: dictionary, if given, steps in env are stored to its 'model_steps', coverage of the model
+                  to 'coverage' and whether learn_policy was used to 'fallback'
+    :return: dictionary of policy, indexed by state coordinates
+    """
+    maze = TabularMaze(env, probs, model_episodes)
+    if stats is not None:
+        stats['model_steps'] = maze.steps
+        stats['coverage'] = maze.coverage()
+        stats['fallback'] = not maze.terminal.any()
+    if not maze.terminal.any():
+        return learn_policy(env)
+    maze_size = (maze.width, maze.height)
+    q_table = np.zeros([maze_size[0], maze_size[1], maze.num_actions], dtype=float)
 
     alpha = 1   # learning rate
     k = 50
     t = 0
     while t < 500 and alpha > 0.1:
-        t += 1
+        t += num_walks
         alpha = k / (k + t)
-        walk_randomly(env, alpha, q_table)
+        walk_simulated(maze, alpha, q_table, num_walks)
 
-    policy = find_policy(q_table, maze_size)
+    known = maze.known_actions().reshape(q_table.shape)
+    policy = find_policy(np.where(known, q_table, -np.inf), maze_size)
     return policy
@@ -0,0 +1,143 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+"""
+Tabular simulator of a maze environment for fast Q-learning
+"""
+
+import numpy as np
+
+DELTAS = [(0, -1), (1, 0), (0, 1), (-1, 0)]     # possible moves between neighbouring cells, clockwise
+PATIENCE = 20   # number of model episodes in a row without a new observed move to stop learning the model
+WALL_EVIDENCE = 5   # expected number of moves in a direction never seen moving away to take it as a wall
+
+
+class TabularMaze:
+    """
+    Maze model learnt from walks in the real environment. States are flat cell indices x * height + y,
+    a step of many walks at once is only a few array lookups. Only moves observed in the real environment
+    are known to the model, a step by an unobserved move is reported as unknown instead of guessed.
+
+    Actions are confused like in kuimaze2.mdp: the intended action is performed with probability forward,
+    the action turned clockwise with probability right, the opposite one with probability backward
+    and the action turned counterclockwise with probability left.
+    """
+
+    def __init__(self, env, probs=(0.8, 0.1, 0.1, 0), episodes=200, seed=None, patience=PATIENCE):
+        """
+        :param env: object, for us it will be kuimaze.Maze object
+        :param probs: probabilities of (forward, left, right, backward) action confusions
+        :param episodes: maximal number of walks in env used to learn the model
+        :param patience: number of walks in a row without a new observed move to stop learning the model
+        :param seed: seed of the random generator of the simulator
+        """
+        self.width = env.observation_space.spaces[0].n
+        self.height = env.observation_space.spaces[1].n
+        self.num_actions = env.action_space.n
+        forward, left, right, backward = probs
+        self.confusion_probs = np.array([forward, right, backward, left], dtype=float)  # turns by 0, 1, 2, 3
+        self.confusion_probs /= self.confusion_probs.sum()
+        self.rng = np.random.default_rng(seed)
+        self.learn(env, episodes, patience)
+
+    def learn(self, env, episodes, patience=PATIENCE):
+        """
+        Walks in env and records where moves lead, rewards and terminal states. Every walk takes the action
+        tried the least times in the cell, so the walks spread to untried moves faster than random ones.
+        """
+        size = self.width * self.height
+        cells = np.arange(size)
+        moves = np.tile(cells[:, None], (1, len(DELTAS)))   # cell after the move in direction, blocked by default
+        rewards = np.zeros((size, len(DELTAS)))             # reward for the move in direction
+        stay_rewards = np.zeros(size)                       # reward for bumping into a wall
+        stay_known = np.zeros(size, dtype=bool)             # bumping into a wall was observed in the cell
+        self.observed = np.zeros((size, len(DELTAS)), dtype=bool)   # the move in direction is known
+        self.visited = np.zeros(size, dtype=bool)
+        self.terminal = np.zeros(size, dtype=bool)
+        delta_counts = np.zeros((self.num_actions, len(DELTAS)), dtype=int)    # action -> observed directions
+        tries = np.zeros((size, self.num_actions), dtype=int)
+        MAX_T = 1000
+
+        observed = []   # (cell, action, next cell, reward) of all steps
+        observed_pairs = set()  # (cell, next cell) of all steps
+        episodes_without_new = 0
+        for _ in range(episodes):
+            obv = env.reset()
+            self.start = obv[0] * self.height + obv[1]
+            cell = self.start
+            is_done = False
+            t = 0
+            known_pairs = len(observed_pairs)
+            while not is_done and t < MAX_T:
+                t += 1
+                least_tried = np.flatnonzero(tries[cell] == tries[cell].min())
+                action = int(self.rng.choice(least_tried))
+                tries[cell, action] += 1
+                obv, reward, is_done, _ = env.step(action)
+                next_cell = obv[0] * self.height + obv[1]
+                observed.append((cell, action, next_cell, reward))
+                observed_pairs.add((cell, next_cell))
+                if is_done:
+                    self.terminal[next_cell] = True
+                cell = next_cell
+            episodes_without_new = episodes_without_new + 1 if len(observed_pairs) == known_pairs else 0
+            if episodes_without_new >= patience:
+                break
+
+        for cell, action, next_cell, reward in observed:
+            (x, y), (next_x, next_y) = divmod(cell, self.height), divmod(next_cell, self.height)
+            self.visited[cell] = True
+            delta = (next_x - x, next_y - y)
+            if delta in DELTAS:
+                direction = DELTAS.index(delta)
+                moves[cell, direction] = next_cell
+                rewards[cell, direction] = reward
+                self.observed[cell, direction] = True
+                delta_counts[action, direction] += 1
+            else:
+                stay_rewards[cell] = reward
+                stay_known[cell] = True
+
+        # direction performed by every action is the one most often observed after it
+        self.action_directions = np.argmax(delta_counts, axis=1)
+        # expected number of moves in every direction from the tries of actions and their confusions
+        turns = (np.arange(len(DELTAS))[None, :] - self.action_directions[:, None]) % len(DELTAS)
+        expected_moves = tries @ self.confusion_probs[turns]
+        # a direction never seen moving away is a wall if bumping was seen in the cell and enough moves were expected
+        blocked = ~self.observed & stay_known[:, None] & (expected_moves >= WALL_EVIDENCE)
+        rewards[blocked] = np.repeat(stay_rewards[:, None], len(DELTAS), axis=1)[blocked]
+        self.observed |= blocked
+        self.moves = moves
+        self.rewards = rewards
+        self.steps = len(observed)      # number of steps done in the real environment
+
+    def coverage(self):
+        """
+        :return: fraction of moves of the visited non-terminal cells known to the model
+        """
+        cells = self.visited & ~self.terminal
+        return float(self.observed[cells].mean()) if cells.any() else 0.0
+
+    def known_actions(self):
+        """
+        :return: bool array (cell, action), True if the intended direction of the action is known in the cell
+        """
+        return self.observed[:, self.action_directions]
+
+    def reset(self, n):
+        """
+        :return: array of start cells of n walks
+        """
+        return np.full(n, self.start, dtype=np.int64)
+
+    def step(self, cells, actions):
+        """
+        One step of many walks at once
+        :param cells: array of current cells
+        :param actions: array of intended actions
+        :return: (next cells, rewards, is_done, is_known) arrays, the move of a step that is not known
+                 is not observed in the real environment, its next cell and reward are not valid
+        """
+        turns = self.rng.choice(len(self.confusion_probs), size=len(cells), p=self.confusion_probs)
+        directions = (self.action_directions[actions] + turns) % len(DELTAS)
+        next_cells = self.moves[cells, directions]
+        return next_cells, self.rewards[cells, directions], self.terminal[next_cells], self.observed[cells, directions]
@@ -9,28 +9,36 @@ Homework #02-Search for B3B33KUI
 import time
 import kuimaze
 import os
+import math
 import heapq as hq
+from maze_graph import MazeGraph
+
+STRATEGIES = ('astar', 'bidirectional', 'jps')
 
-class Node:
-    def __init__(self, parent=None, position=None, price=None):
-        self.parent = parent
-        self.position = position    # x,y coordinates
-        if parent != None:
-            self.price = parent.price + price
-        else:
-            self.price = price;
-        self.estimate= 0      # total price from start + Manhattan distance to goal
-    
-    def get_estimate(self, goal):
-        distance = abs(self.position[0] - goal.position[0]) + abs(self.position[1] - goal.position[1])
-        self.estimate = self.price + distance
-    
-    def __lt__(self,nxt):   # overwrites the comparison operator in heapq
-        return self.estimate <= nxt.estimate
 
 class Agent(kuimaze.BaseAgent):
-    def __init__(self, environment):
+    def __init__(self, environment, strategy='astar', oracle=None, compiled=False):
+        '''
+        :param environment: kuimaze environment to search in
+        :param strategy: search strategy, one of STRATEGIES:
+            'astar' - A* with Manhattan distance heuristic,
+            'bidirectional' - A* running from the start and from the goal at once,
+            'jps' - jump point search, only for mazes where every move costs the same
+        :param oracle: optional DistanceOracle of the map, paths to its prepared goals are only looked up
+            and A* uses its landmark heuristic for the others
+        :param compiled: compile the whole reachable maze into MazeGraph on the first search and search it
+            without calling the environment, worth it only when the agent answers many queries on the maze,
+            otherwise every expanded cell is asked from the environment; the graph of the oracle is used
+            whenever the oracle has compiled one
+        '''
+        if strategy not in STRATEGIES:
+            raise ValueError('unknown search strategy: %s' % strategy)
         self.environment = environment
+        self.strategy = strategy
+        self.oracle = oracle
+        self.compiled = compiled
+        self.graph = None       # MazeGraph of the environment, compiled on the first search
+        self.expanded = 0       # number of expanded nodes in the last search
 
     def find_path(self):
         '''
@@ -40,41 +48,314 @@ class Agent(kuimaze.BaseAgent):
         observation = self.environment.reset()  # must be called first, it is necessary for maze initialization
         goal = observation[1][0:2]
         start = observation[0][0:2]             # initial state (x, y)
-        
-        goal_node = Node(None, goal, 0)
-        start_node = Node(None, start, 0)
-        
-        opened = []     # store currently opened nodes
-        visited = []    # store visited nodes
-        hq.heapify(opened)
-        start_node.get_estimate(goal_node)
-        hq.heappush(opened, start_node)
-        
-        path = None
+
+        # search state is kept in flat arrays indexed by cell index = x * height + y
+        self.width = self.environment.observation_space.spaces[0].n
+        self.height = self.environment.observation_space.spaces[1].n
+        self.successors = {}        # cell index -> [(cell index, cost), ... ], filled lazily from environment when not compiled
+        self.expanded = 0
+
+        start_index = start[0] * self.height + start[1]
+        goal_index = goal[0] * self.height + goal[1]
+
         print("Starting searching")
+        path = False    # goal distances were not prepared in oracle
+        if self.oracle is not None:
+            path = self.oracle.lookup_path(start_index, goal_index)
+        if path is False:
+            path = self.search(start_index, goal_index)
+
+        if path is not None:
+            print("goal reached")
+            path = [divmod(index, self.height) for index in path]   # create path as list of tuples in format: [(x1, y1), (x2, y2), ... ]
+        return path
+
+    def search(self, start, goal):
+        '''
+        runs the search strategy of the agent
+        return: list of cell indices from start to goal or None
+        '''
+        if self.graph is None:
+            if self.oracle is not None and self.oracle.graph is not None:
+                self.graph = self.oracle.graph
+            elif self.compiled:
+                self.graph = MazeGraph(self.environment, divmod(start, self.height))
+        if self.strategy == 'bidirectional':
+            return self.search_bidirectional(start, goal)
+        if self.strategy == 'jps':
+            return self.search_jump_points(start, goal)
+        if self.oracle is not None:
+            self.oracle.prepare_landmarks(start)
+            return self.search_astar(start, goal, self.oracle.get_heuristic(goal))
+        return self.search_astar(start, goal)
+
+    def get_successors(self, index):
+        '''
+        return: (cell index, cost) pairs reachable from the cell, each cell is asked from environment only once
+        '''
+        if self.graph is not None:
+            return self.graph.get_successors(index)
+        successors = self.successors.get(index)
+        if successors is None:
+            height = self.height
+            successors = [(x * height + y, cost) for (x, y), cost in self.environment.expand(divmod(index, height))]
+            self.successors[index] = successors
+        return successors
+
+    def get_predecessors(self, index):
+        '''
+        return: (cell index, cost) pairs of cells from which the cell can be entered
+        '''
+        if self.graph is not None:
+            return self.graph.get_predecessors(index)
+        predecessors = []
+        for predecessor, _ in self.get_successors(index):
+            cost = self.get_move_cost(predecessor, index)
+            if cost is not None:
+                predecessors.append((predecessor, cost))
+        return predecessors
+
+    def get_distance(self, index1, index2):
+        '''
+        return: Manhattan distance between two cells
+        '''
+        x1, y1 = divmod(index1, self.height)
+        x2, y2 = divmod(index2, self.height)
+        return abs(x1 - x2) + abs(y1 - y2)
+
+    def reconstruct_path(self, parent, index):
+        '''
+        walks the parent array back from the cell
+        return: list of cell indices from the root of the search to the cell
+        '''
+        path = []
+        while index != -1:
+            path.append(index)
+            index = parent[index]
+        path.reverse()
+        return path
+
+    def search_astar(self, start, goal, heuristic=None):
+        '''
+        A* search with Manhattan distance heuristic
+        :param heuristic: optional list of lower bounds of distances to goal for every cell, replaces Manhattan distance
+        return: list of cell indices from start to goal or None
+        '''
+        height = self.height
+        size = self.width * height
+        price = [math.inf] * size       # cheapest known price from start
+        estimate = [math.inf] * size    # price from start + Manhattan distance to goal
+        parent = [-1] * size            # index of the previous cell on the cheapest path
+        closed = bytearray(size)        # 1 for already expanded cells
+        goal_x, goal_y = divmod(goal, height)
+
+        price[start] = 0
+        estimate[start] = self.get_distance(start, goal) if heuristic is None else heuristic[start]
+        opened = [(estimate[start], estimate[start], start)]    # heap of (estimate, distance to goal, cell index) tuples,
+                                                                # ties are broken in favour of cells closer to goal
+
         while len(opened) > 0:      # search until no more nodes avalable
-            current_node = hq.heappop(opened) 
-            visited.append(current_node.position)
-
-            if current_node.position == goal_node.position:
-                print("goal reached")
-                path = []
-                while current_node != None:
-                    path.insert(0, current_node.position) # create path as list of tuples in format: [(x1, y1), (x2, y2), ... ]
-                    current_node = current_node.parent
-                break
-            
-            new_positions = self.environment.expand(current_node.position)         # [[(x1, y1), cost], [(x2, y2), cost], ... ]
-            for position in new_positions:
-                if position[0] in visited:  # ignore already visited nodes
+            current_estimate, _, current = hq.heappop(opened)
+            if closed[current] or current_estimate > estimate[current]:    # stale entry, cell was reached cheaper before
+                continue
+            closed[current] = 1
+            self.expanded += 1
+
+            if current == goal:
+                return self.reconstruct_path(parent, current)
+
+            current_price = price[current]
+            for index, cost in self.get_successors(current):     # [(index1, cost), (index2, cost), ... ]
+                if closed[index]:  # ignore already visited nodes
                     continue
-                node = Node(current_node, position[0], position[1])
-                node.get_estimate(goal_node)
-                hq.heappush(opened, node)
-            
+                new_price = current_price + cost
+                if new_price >= price[index]:     # not better than the entry already in heap
+                    continue
+                x, y = divmod(index, height)
+                distance = abs(x - goal_x) + abs(y - goal_y) if heuristic is None else heuristic[index]
+                price[index] = new_price
+                parent[index] = current
+                estimate[index] = new_price + distance
+                hq.heappush(opened, (estimate[index], distance, index))
+
             # self.environment.render()               # show enviroment's GUI       DO NOT FORGET TO COMMENT THIS LINE BEFORE FINAL SUBMISSION!      
             # time.sleep(0.1)                         # sleep for demonstartion     DO NOT FORGET TO COMMENT THIS LINE BEFORE FINAL SUBMISSION! 
 
+        return None
+
+    def search_bidirectional(self, start, goal):
+        '''
+        Bidirectional A* search, the forward search is guided by distance to goal, the backward one by distance
+        to start. The search stops once no opened node of either direction can improve the best meeting price.
+        return: list of cell indices from start to goal or None
+        '''
+        size = self.width * self.height
+        # index 0 is the forward search from start, index 1 the backward search from goal
+        roots = (start, goal)
+        price = ([math.inf] * size, [math.inf] * size)
+        parent = ([-1] * size, [-1] * size)
+        closed = (bytearray(size), bytearray(size))
+        opened = ([], [])
+        for side in (0, 1):
+            price[side][roots[side]] = 0
+            distance = self.get_distance(roots[side], roots[1 - side])
+            hq.heappush(opened[side], (distance, distance, roots[side]))
+
+        best_price = math.inf if start != goal else 0
+        meeting = start
+        while opened[0] and opened[1]:
+            if opened[0][0][0] >= best_price or opened[1][0][0] >= best_price:   # no better path can be found
+                break
+            side = 0 if len(opened[0]) <= len(opened[1]) else 1
+            current_estimate, _, current = hq.heappop(opened[side])
+            if closed[side][current]:
+                continue
+            closed[side][current] = 1
+            self.expanded += 1
+
+            current_price = price[side][current]
+            target = roots[1 - side]
+            # backward search goes against the moves, from current to cells from which it can be entered
+            neighbours = self.get_successors(current) if side == 0 else self.get_predecessors(current)
+            for index, cost in neighbours:
+                if closed[side][index]:
+                    continue
+                new_price = current_price + cost
+                if new_price >= price[side][index]:
+                    continue
+                distance = self.get_distance(index, target)
+                price[side][index] = new_price
+                parent[side][index] = current
+                hq.heappush(opened[side], (new_price + distance, distance, index))
+                if new_price + price[1 - side][index] < best_price:    # both searches met in this cell
+                    best_price = new_price + price[1 - side][index]
+                    meeting = index
+
+        if best_price == math.inf:
+            return None
+        path = self.reconstruct_path(parent[0], meeting)
+        index = parent[1][meeting]
+        while index != -1:
+            path.append(index)
+            index = parent[1][index]
+        return path
+
+    def get_move_cost(self, index, target):
+        '''
+        return: price of the move from cell index to neighbouring cell target or None if it is not possible
+        '''
+        for successor, cost in self.get_successors(index):
+            if successor == target:
+                return cost
+        return None
+
+    def search_jump_points(self, start, goal):
+        '''
+        Jump point search for 4-connected mazes with uniform move cost. Straight runs without forced
+        neighbours are skipped, only jump points are pushed to the heap.
+        return: list of cell indices from start to goal or None
+        '''
+        height = self.height
+        size = self.width * height
+        price = [math.inf] * size
+        parent = [-1] * size
+        closed = bytearray(size)
+        if self.graph is not None and not self.graph.is_uniform():
+            raise ValueError('jump point search needs uniform move costs')
+        successors = list(self.get_successors(start))
+        step_cost = successors[0][1] if successors else 1
+
+        price[start] = 0
+        distance = self.get_distance(start, goal) * step_cost
+        opened = [(distance, distance, start)]
+        while len(opened) > 0:
+            current_estimate, _, current = hq.heappop(opened)
+            if closed[current]:
+                continue
+            closed[current] = 1
+            self.expanded += 1
+
+            if current == goal:
+                return self.fill_jumps(self.reconstruct_path(parent, current))
+
+            for dx, dy in self.get_jump_directions(current, parent[current]):
+                jump_point = self.jump(current, dx, dy, goal, step_cost)
+                if jump_point == -1 or closed[jump_point]:
+                    continue
+                new_price = price[current] + self.get_distance(current, jump_point) * step_cost
+                if new_price >= price[jump_point]:
+                    continue
+                distance = self.get_distance(jump_point, goal) * step_cost
+                price[jump_point] = new_price
+                parent[jump_point] = current
+                hq.heappush(opened, (new_price + distance, distance, jump_point))
+
+        return None
+
+    def get_jump_directions(self, index, parent_index):
+        '''
+        return: directions (dx, dy) worth jumping to from the cell, all four for the start cell,
+            otherwise forward and both sides of the direction it was reached from
+        '''
+        if parent_index == -1:
+            return ((1, 0), (-1, 0), (0, 1), (0, -1))
+        x, y = divmod(index, self.height)
+        parent_x, parent_y = divmod(parent_index, self.height)
+        if x != parent_x:
+            dx = 1 if x > parent_x else -1
+            return ((dx, 0), (0, 1), (0, -1))
+        dy = 1 if y > parent_y else -1
+        return ((0, dy), (1, 0), (-1, 0))
+
+    def can_move(self, index, dx, dy, step_cost):
+        '''
+        return: True if it is possible to move from the cell in direction (dx, dy)
+        '''
+        if self.graph is not None:      # move costs were already checked to be uniform
+            return self.graph.can_move(index, dx, dy)
+        target = index + dx * self.height + dy
+        for successor, cost in self.get_successors(index):
+            if successor == target:
+                if cost != step_cost:
+                    raise ValueError('jump point search needs uniform move costs')
+                return True
+        return False
+
+    def jump(self, index, dx, dy, goal, step_cost):
+        '''
+        moves from the cell in direction (dx, dy) until it finds a jump point
+        return: index of the jump point or -1 if the run ends in a wall
+        '''
+        height = self.height
+        step = dx * height + dy
+        while self.can_move(index, dx, dy, step_cost):
+            index += step
+            if index == goal:
+                return index
+            if dx != 0:     # horizontal run, look for forced neighbours above and below
+                for side in (1, -1):
+                    if self.can_move(index, 0, side, step_cost) and not self.can_move(index - step, 0, side, step_cost):
+                        return index
+            else:           # vertical run, look for forced neighbours on both sides and for horizontal jump points
+                for side in (1, -1):
+                    if self.can_move(index, side, 0, step_cost) and not self.can_move(index - step, side, 0, step_cost):
+                        return index
+                if self.jump(index, 1, 0, goal, step_cost) != -1 or self.jump(index, -1, 0, goal, step_cost) != -1:
+                    return index
+        return -1
+
+    def fill_jumps(self, jump_points):
+        '''
+        return: list of all cell indices on the straight runs between consecutive jump points
+        '''
+        path = jump_points[:1]
+        for index in jump_points[1:]:
+            x, y = divmod(path[-1], self.height)
+            target_x, target_y = divmod(index, self.height)
+            step = (target_x > x) - (target_x < x), (target_y > y) - (target_y < y)
+            step = step[0] * self.height + step[1]
+            while path[-1] != index:
+                path.append(path[-1] + step)
         return path
 
 
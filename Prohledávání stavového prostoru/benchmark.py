@@ -0,0 +1,82 @@
+#!/usr/bin/python3
+'''
+Benchmark of the search agent over all bundled maps.
+
+usage: python benchmark.py [maps_root] [strategy,strategy,...]
+'''
+
+import os
+import io
+import sys
+import time
+import contextlib
+import tracemalloc
+import kuimaze
+from agent import Agent, STRATEGIES
+from maze_graph import MazeGraph
+
+MAP_DIRS = ['maps', 'maps_difficult']
+MAP_EXTENSIONS = ('.bmp', '.png')
+
+
+def list_maps(root):
+    '''
+    return: sorted list of all map images in MAP_DIRS under root
+    '''
+    maps = []
+    for map_dir in MAP_DIRS:
+        for dirpath, _, filenames in os.walk(os.path.join(root, map_dir)):
+            for filename in filenames:
+                if filename.lower().endswith(MAP_EXTENSIONS):
+                    maps.append(os.path.join(dirpath, filename))
+    return sorted(maps)
+
+
+def run_search(map_path, strategy='astar', compiled=False, trace_memory=False):
+    '''
+    runs one search on the given map
+    :param strategy: search strategy of the agent
+    :param compiled: search the compiled MazeGraph instead of asking the environment
+    :param trace_memory: measure peak memory of the search (makes the search slower)
+    return: (path length, number of expanded nodes, wall time in seconds, peak memory in bytes,
+        time of the maze compilation in seconds)
+    '''
+    env = kuimaze.InfEasyMaze(map_image=map_path, grad=(0, 0))
+    agent = Agent(env, strategy, compiled=compiled)
+    compile_time = 0
+    if compiled:
+        start_time = time.perf_counter()
+        agent.graph = MazeGraph(env, env.reset()[0][0:2])
+        compile_time = time.perf_counter() - start_time
+    peak_memory = 0
+    with contextlib.redirect_stdout(io.StringIO()):     # silence progress prints of the agent
+        if trace_memory:
+            tracemalloc.start()
+        start_time = time.perf_counter()
+        path = agent.find_path()
+        wall_time = time.perf_counter() - start_time
+        if trace_memory:
+            peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+    return (len(path) if path is not None else 0), agent.expanded, wall_time, peak_memory, compile_time
+
+
+def main():
+    root = sys.argv[1] if len(sys.argv) > 1 else os.path.dirname(os.path.abspath(__file__))
+    strategies = sys.argv[2].split(',') if len(sys.argv) > 2 else STRATEGIES
+    print('%-40s %-14s %-6s %8s %10s %12s %10s %12s %14s %12s' % ('map', 'strategy', 'maze', 'path', 'expanded',
+                                                                  'compile [s]', 'time [s]', 'expanded/s',
+                                                                  'us/expansion', 'peak [kB]'))
+    for map_path in list_maps(root):
+        for strategy in strategies:
+            for compiled in (True, False):
+                path_length, expanded, wall_time, _, compile_time = run_search(map_path, strategy, compiled)
+                peak_memory = run_search(map_path, strategy, compiled, trace_memory=True)[3]
+                print('%-40s %-14s %-6s %8d %10d %12.3f %10.3f %12.0f %14.2f %12.1f' % (
+                    os.path.relpath(map_path, root), strategy, 'graph' if compiled else 'env', path_length, expanded,
+                    compile_time, wall_time, expanded / max(wall_time, 1e-9), 1e6 * wall_time / max(expanded, 1),
+                    peak_memory / 1024))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,201 @@
+#!/usr/bin/python3
+'''
+Precomputed distance tables for answering many path queries on one map.
+
+The oracle stores per map file:
+    * distance fields to goals, a path to such goal is found only by lookups,
+    * landmark (ALT) distance tables, which give A* a much tighter heuristic for any other goal.
+Landmark tables are saved into a .npz file and every goal table into its own .npy file, so next runs
+on the same map with the same move costs do not pay the precomputation again.
+'''
+
+import os
+import glob
+import math
+import hashlib
+import heapq as hq
+import numpy as np
+from maze_graph import MazeGraph
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'oracle_cache')
+
+
+class DistanceOracle:
+    def __init__(self, environment, map_path, num_landmarks=4, cache_dir=CACHE_DIR, grad=(0, 0)):
+        '''
+        :param environment: kuimaze environment with the map loaded from map_path
+        :param map_path: path to the map image, used as a key of the cache
+        :param num_landmarks: number of landmarks for ALT heuristic
+        :param cache_dir: directory for the cache files, None disables persistence
+        :param grad: gradient of move costs the environment was created with, used as a key of the cache
+        '''
+        self.environment = environment
+        self.width = environment.observation_space.spaces[0].n
+        self.height = environment.observation_space.spaces[1].n
+        self.num_landmarks = num_landmarks
+        self.cache_path = None
+        if cache_dir is not None:
+            self.cache_path = os.path.join(cache_dir, self.get_cache_name(map_path, grad))
+
+        self.graph = None           # MazeGraph of the environment, compiled only when some table is computed
+        self.landmarks = np.zeros(0, dtype=np.int64)
+        self.from_landmarks = np.zeros((0, self.width * self.height))    # distances from every landmark
+        self.to_landmarks = np.zeros((0, self.width * self.height))      # distances to every landmark
+        self.goal_distances = {}    # goal cell index -> distances of all cells to the goal
+        self.load()
+
+    def get_cache_name(self, map_path, grad):
+        '''
+        return: prefix of file names unique for the map file, its content version and move costs
+        '''
+        map_path = os.path.abspath(map_path)
+        stat = os.stat(map_path)
+        key = '%s:%d:%d:%d:%r' % (map_path, stat.st_mtime_ns, stat.st_size, self.num_landmarks,
+                                  tuple(float(g) for g in grad))
+        name = os.path.splitext(os.path.basename(map_path))[0]
+        return '%s_%s' % (name, hashlib.md5(key.encode()).hexdigest()[:12])
+
+    def load(self):
+        '''
+        loads the precomputed tables from the cache files if they exist
+        '''
+        if self.cache_path is None:
+            return
+        if os.path.exists(self.cache_path + '.npz'):
+            with np.load(self.cache_path + '.npz') as data:
+                self.landmarks = data['landmarks']
+                self.from_landmarks = data['from_landmarks']
+                self.to_landmarks = data['to_landmarks']
+        for path in glob.glob(glob.escape(self.cache_path) + '_goal_*.npy'):
+            goal = int(path[len(self.cache_path) + 6:-4])
+            self.goal_distances[goal] = np.load(path)
+
+    def save_landmarks(self):
+        '''
+        stores the landmark tables into the cache file
+        '''
+        if self.cache_path is None:
+            return
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        np.savez_compressed(self.cache_path + '.npz', landmarks=self.landmarks, from_landmarks=self.from_landmarks,
+                            to_landmarks=self.to_landmarks)
+
+    def save_goal(self, goal):
+        '''
+        stores the distance table of one goal into its own cache file
+        '''
+        if self.cache_path is None:
+            return
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        np.save('%s_goal_%d.npy' % (self.cache_path, goal), self.goal_distances[goal])
+
+    def dijkstra(self, source, reverse=False):
+        '''
+        :param reverse: go against the moves, the result are then distances from all cells to the source
+        return: array of distances from the source to all cells, inf for unreachable ones
+        '''
+        offsets = self.graph.reverse_offsets if reverse else self.graph.offsets
+        neighbours = self.graph.reverse_neighbours if reverse else self.graph.neighbours
+        costs = self.graph.reverse_costs if reverse else self.graph.costs
+        distances = [math.inf] * (self.width * self.height)
+        distances[source] = 0
+        opened = [(0, source)]
+        while opened:
+            distance, index = hq.heappop(opened)
+            if distance > distances[index]:
+                continue
+            start, end = offsets[index], offsets[index + 1]
+            for neighbour, cost in zip(neighbours[start:end], costs[start:end]):
+                new_distance = distance + cost
+                if new_distance < distances[neighbour]:
+                    distances[neighbour] = new_distance
+                    hq.heappush(opened, (new_distance, neighbour))
+        return np.array(distances)
+
+    def ensure_graph(self, seed):
+        if self.graph is None:
+            self.graph = MazeGraph(self.environment, divmod(seed, self.height))
+
+    def prepare_landmarks(self, seed):
+        '''
+        chooses landmarks by farthest point selection and computes distances from and to all of them
+        :param seed: any cell of the maze, the first landmark is the farthest cell from it
+        '''
+        if len(self.landmarks) > 0:
+            return
+        self.ensure_graph(seed)
+        nearest = self.dijkstra(seed)
+        landmarks, from_landmarks, to_landmarks = [], [], []
+        for _ in range(self.num_landmarks):
+            reachable = np.where(np.isfinite(nearest), nearest, -1)
+            landmark = int(np.argmax(reachable))
+            if reachable[landmark] <= 0:
+                break
+            landmarks.append(landmark)
+            from_landmarks.append(self.dijkstra(landmark))
+            to_landmarks.append(self.dijkstra(landmark, reverse=True))
+            nearest = np.minimum(nearest, from_landmarks[-1])
+        # there are no landmarks when no other cell is reachable from the seed
+        self.landmarks = np.array(landmarks, dtype=np.int64)
+        self.from_landmarks = np.array(from_landmarks).reshape(len(landmarks), self.width * self.height)
+        self.to_landmarks = np.array(to_landmarks).reshape(len(landmarks), self.width * self.height)
+        self.save_landmarks()
+
+    def prepare_goal(self, goal, seed=None):
+        '''
+        computes distances of all cells to the goal, so paths to it are answered by lookups only
+        '''
+        if goal in self.goal_distances:
+            return
+        self.ensure_graph(goal if seed is None else seed)
+        self.goal_distances[goal] = self.dijkstra(goal, reverse=True)
+        self.save_goal(goal)
+
+    def get_heuristic(self, goal):
+        '''
+        ALT heuristic for the goal, by triangle inequality for every landmark L:
+            d(n, goal) >= d(L, goal) - d(L, n) and d(n, goal) >= d(n, L) - d(goal, L)
+        return: list of lower bounds of distances of all cells to the goal (at least Manhattan distance)
+        '''
+        x, y = np.divmod(np.arange(self.width * self.height), self.height)
+        goal_x, goal_y = divmod(goal, self.height)
+        bounds = [np.abs(x - goal_x) + np.abs(y - goal_y)]
+        with np.errstate(invalid='ignore'):
+            for from_landmark, to_landmark in zip(self.from_landmarks, self.to_landmarks):
+                bounds.append(from_landmark[goal] - from_landmark)
+                bounds.append(to_landmark - to_landmark[goal])
+        heuristic = np.max(np.nan_to_num(np.array(bounds, dtype=float), nan=0, posinf=0, neginf=0), axis=0)
+        return heuristic.tolist()
+
+    def get_successors(self, index):
+        '''
+        return: (cell index, cost) pairs reachable from the cell
+        '''
+        if self.graph is not None:
+            return self.graph.get_successors(index)
+        return [(x * self.height + y, cost) for (x, y), cost in self.environment.expand(divmod(index, self.height))]
+
+    def lookup_path(self, start, goal):
+        '''
+        follows the distance field of a prepared goal
+        return: list of cell indices from start to goal, None if the goal is unreachable
+            or False if the goal was not prepared or its table does not lead through the maze,
+            the path has to be searched then
+        '''
+        distances = self.goal_distances.get(goal)
+        if distances is None:
+            return False
+        if not np.isfinite(distances[start]):
+            return None
+        path = [start]
+        while path[-1] != goal:
+            index = path[-1]
+            best = None
+            for successor, cost in self.get_successors(index):
+                if abs(cost + distances[successor] - distances[index]) < 1e-9:   # move along the shortest path
+                    best = successor
+                    break
+            if best is None:
+                return False
+            path.append(best)
+        return path
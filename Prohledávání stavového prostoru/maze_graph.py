@@ -0,0 +1,90 @@
+#!/usr/bin/python3
+'''
+Maze compiled into a flat adjacency structure (compressed sparse rows).
+
+Successors of the cell with index i = x * height + y are
+    neighbours[offsets[i]:offsets[i + 1]] with costs costs[offsets[i]:offsets[i + 1]],
+the same for predecessors in reverse_* arrays. The environment is asked only once per reachable cell.
+Bit masks in moves tell in which directions it is possible to move from each cell.
+'''
+
+from array import array
+
+
+class MazeGraph:
+    def __init__(self, environment, seed):
+        '''
+        :param environment: kuimaze environment providing expand()
+        :param seed: (x, y) position, all cells reachable from it are compiled
+        '''
+        self.width = environment.observation_space.spaces[0].n
+        self.height = environment.observation_space.spaces[1].n
+        size = self.width * self.height
+
+        edges = {}      # cell index -> [(cell index, cost), ... ]
+        queue = [seed[0] * self.height + seed[1]]
+        discovered = bytearray(size)
+        discovered[queue[0]] = 1
+        for index in queue:
+            successors = [(x * self.height + y, cost) for (x, y), cost in environment.expand(divmod(index, self.height))]
+            edges[index] = successors
+            for successor, _ in successors:
+                if not discovered[successor]:
+                    discovered[successor] = 1
+                    queue.append(successor)
+
+        self.offsets, self.neighbours, self.costs = self.to_arrays(size, edges)
+        reverse_edges = {}
+        for index, successors in edges.items():
+            for successor, cost in successors:
+                reverse_edges.setdefault(successor, []).append((index, cost))
+        self.reverse_offsets, self.reverse_neighbours, self.reverse_costs = self.to_arrays(size, reverse_edges)
+        self.cells = len(queue)     # number of compiled cells
+
+        self.moves = bytearray(size)
+        self.directions = {(1, 0): 1, (-1, 0): 2, (0, 1): 4, (0, -1): 8}   # (dx, dy) -> bit in moves
+        steps = {self.height * dx + dy: bit for (dx, dy), bit in self.directions.items()}
+        for index, successors in edges.items():
+            for successor, _ in successors:
+                self.moves[index] |= steps.get(successor - index, 0)
+
+    @staticmethod
+    def to_arrays(size, edges):
+        '''
+        return: (offsets, neighbours, costs) arrays of the edges
+        '''
+        offsets = array('l', [0]) * (size + 1)
+        neighbours = array('l')
+        costs = array('d')
+        for index in range(size):
+            for neighbour, cost in edges.get(index, ()):
+                neighbours.append(neighbour)
+                costs.append(cost)
+            offsets[index + 1] = len(neighbours)
+        return offsets, neighbours, costs
+
+    def get_successors(self, index):
+        '''
+        return: iterator of (cell index, cost) pairs reachable from the cell
+        '''
+        start, end = self.offsets[index], self.offsets[index + 1]
+        return zip(self.neighbours[start:end], self.costs[start:end])
+
+    def get_predecessors(self, index):
+        '''
+        return: iterator of (cell index, cost) pairs from which the cell can be entered
+        '''
+        start, end = self.reverse_offsets[index], self.reverse_offsets[index + 1]
+        return zip(self.reverse_neighbours[start:end], self.reverse_costs[start:end])
+
+    def can_move(self, index, dx, dy):
+        '''
+        return: True if it is possible to move from the cell in direction (dx, dy)
+        '''
+        return self.moves[index] & self.directions[dx, dy] != 0
+
+    def is_uniform(self):
+        '''
+        return: True if all moves in the maze cost the same
+        '''
+        return len(self.costs) == 0 or min(self.costs) == max(self.costs)
@@ -0,0 +1,160 @@
+from game_board import GameBoard
+
+directions_cache = {}
+
+
+def get_directions(board_size):
+    '''
+    Shifts moving a bitboard by one square in each of 8 directions. Square [x,y] is the bit x*board_size+y.
+    :return: list of (shift, mask), a bitboard is moved by (bits << shift) & mask, negative shift moves right
+    '''
+    if board_size not in directions_cache:
+        full = (1 << board_size * board_size) - 1
+        first_column = 0
+        for x in range(board_size):
+            first_column |= 1 << (x * board_size)
+        last_column = first_column << (board_size - 1)
+        not_first = full & ~first_column   # squares where a stone moved by +1 in y can land
+        not_last = full & ~last_column     # squares where a stone moved by -1 in y can land
+        directions_cache[board_size] = [
+            (-board_size - 1, not_last), (-board_size, full), (-board_size + 1, not_first), (1, not_first),
+            (board_size + 1, not_first), (board_size, full), (board_size - 1, not_last), (-1, not_last)]
+    return directions_cache[board_size]
+
+
+def shift(bits, direction):
+    amount, mask = direction
+    if amount > 0:
+        return (bits << amount) & mask
+    return (bits >> -amount) & mask
+
+
+def get_moves(own, opponent, board_size):
+    '''
+    :param own: bitboard of stones of the player on move
+    :param opponent: bitboard of stones of the opponent
+    :return: bitboard of all correct moves of the player
+    '''
+    empty = ~(own | opponent) & ((1 << board_size * board_size) - 1)
+    moves = 0
+    for direction in get_directions(board_size):
+        # opponents stones reachable from own stone by a line of opponent stones
+        line = shift(own, direction) & opponent
+        for _ in range(board_size - 3):
+            line |= shift(line, direction) & opponent
+        moves |= shift(line, direction) & empty
+    return moves
+
+
+def get_flips(move, own, opponent, board_size):
+    '''
+    :param move: bitboard with the one square of the move
+    :return: bitboard of opponent stones flipped by the move, 0 if the move is not correct
+    '''
+    flips = 0
+    for direction in get_directions(board_size):
+        line = 0
+        square = shift(move, direction)
+        while square & opponent:
+            line |= square
+            square = shift(square, direction)
+        if square & own:
+            flips |= line
+    return flips
+
+
+class BitboardGameBoard(GameBoard):
+    '''
+    GameBoard keeping stones of both players also as integer bitboards. Moves are generated and stones flipped
+    by shifts and masks of the whole board, the list board is updated only in changed squares, so the API
+    and the results are the same as of GameBoard.
+    '''
+
+    def init_board(self):
+        board = GameBoard.init_board(self)
+        self.bits = {self.p1_color: 0, self.p2_color: 0}
+        for x in range(self.board_size):
+            for y in range(self.board_size):
+                if board[x][y] != self.empty_color:
+                    self.bits[board[x][y]] |= self.get_square(x, y)
+        return board
+
+    def init_moves(self):
+        # moves are generated from the bitboards, no move sets are kept
+        pass
+
+    def get_state(self):
+        '''
+        :return: copy of the board with its bitboards, which set_state restores
+        '''
+        return self.get_board_copy(), dict(self.bits)
+
+    def set_state(self, state):
+        board, bits = state
+        self.board = [row[:] for row in board]
+        self.bits = dict(bits)
+
+    def get_square(self, x, y):
+        return 1 << (x * self.board_size + y)
+
+    def get_opponent_color(self, players_color):
+        if players_color == self.p1_color:
+            return self.p2_color
+        return self.p1_color
+
+    def play_move(self, move, players_color):
+        '''
+        :param move: position where the move is made [x,y]
+        :param player: player that made the move
+        '''
+        opponents_color = self.get_opponent_color(players_color)
+        square = self.get_square(move[0], move[1])
+        flips = get_flips(square, self.bits[players_color], self.bits[opponents_color], self.board_size)
+        self.bits[players_color] |= square | flips
+        self.bits[opponents_color] &= ~flips
+        self.board[move[0]][move[1]] = players_color
+        while flips:
+            low = flips & -flips
+            x, y = divmod(low.bit_length() - 1, self.board_size)
+            self.board[x][y] = players_color
+            flips ^= low
+
+    def is_correct_move(self, move, players_color):
+        '''
+        Check if the move is correct
+        '''
+        square = self.get_square(move[0], move[1])
+        own = self.bits[players_color]
+        opponent = self.bits[self.get_opponent_color(players_color)]
+        if (own | opponent) & square:
+            return False
+        return get_flips(square, own, opponent, self.board_size) != 0
+
+    def get_moves(self, players_color):
+        '''
+        :return: bitboard of all correct moves of the player
+        '''
+        return get_moves(self.bits[players_color], self.bits[self.get_opponent_color(players_color)],
+                         self.board_size)
+
+    def can_play(self, players_color):
+        '''
+        :return: True if there is a possible move for player
+        '''
+        return self.get_moves(players_color) != 0
+
+    def get_score(self):
+        return [bin(self.bits[self.p1_color]).count('1'), bin(self.bits[self.p2_color]).count('1')]
+
+    def get_all_valid_moves(self, players_color):
+        moves = self.get_moves(players_color)
+        valid_moves = []
+        while moves:
+            low = moves & -moves
+            valid_moves.append(divmod(low.bit_length() - 1, self.board_size))
+            moves ^= low
+
+        if len(valid_moves) <= 0:
+            print('No valid move!')
+            return None
+        return valid_moves
@@ -1,6 +1,12 @@
 import copy
 
+DIRECTIONS = [(-1, -1), (-1, 0), (-1, 1), (0, 1), (1, 1), (1, 0), (1, -1), (0, -1)]
+
 class GameBoard(object):
+    '''
+    Besides the board, correct moves of both players and the frontier (empty squares next to a stone)
+    are kept as sets and updated after every move only in squares the move could change.
+    '''
 
     def __init__(self,board_size = 8, player1_color = 0, player2_color = 1, empty_color = -1):
         self.board_size = board_size
@@ -8,9 +14,81 @@ class GameBoard(object):
         self.p2_color = player2_color
         self.empty_color = empty_color
         self.board = self.init_board()
+        self.init_moves()
 
     def clear(self):
         self.board = self.init_board()
+        self.init_moves()
+
+    def init_moves(self):
+        '''
+        Finds the frontier and correct moves of both players by scanning the whole board.
+        '''
+        self.frontier = set()
+        for x in range(self.board_size):
+            for y in range(self.board_size):
+                if self.board[x][y] == self.empty_color and self.has_neighbour_stone(x, y):
+                    self.frontier.add((x, y))
+        self.valid_moves = {self.p1_color: set(), self.p2_color: set()}
+        for square in self.frontier:
+            self.update_square(square)
+
+    def has_neighbour_stone(self, x, y):
+        for dx, dy in DIRECTIONS:
+            posx = x + dx
+            posy = y + dy
+            if (posx>=0) and (posx<self.board_size) and (posy>=0) and (posy<self.board_size):
+                if self.board[posx][posy] != self.empty_color:
+                    return True
+        return False
+
+    def update_square(self, square):
+        '''
+        Recomputes whether the empty square is a correct move of each player.
+        '''
+        for players_color, moves in self.valid_moves.items():
+            if self.scan_move(square, players_color):
+                moves.add(square)
+            else:
+                moves.discard(square)
+
+    def update_moves(self, changed):
+        '''
+        Updates the frontier and correct moves after stones were placed or flipped in changed squares.
+        A change can make a move correct or incorrect only in the first empty square in every direction
+        from the changed square, empty squares farther are separated from it by this one.
+        '''
+        affected = set()
+        for x, y in changed:
+            self.frontier.discard((x, y))
+            for moves in self.valid_moves.values():
+                moves.discard((x, y))
+            for dx, dy in DIRECTIONS:
+                posx = x + dx
+                posy = y + dy
+                while (posx>=0) and (posx<self.board_size) and (posy>=0) and (posy<self.board_size):
+                    if self.board[posx][posy] == self.empty_color:
+                        affected.add((posx, posy))
+                        if abs(posx - x) <= 1 and abs(posy - y) <= 1:
+                            self.frontier.add((posx, posy))
+                        break
+                    posx += dx
+                    posy += dy
+        for square in affected:
+            self.update_square(square)
+
+    def get_state(self):
+        '''
+        :return: copy of the board with its move sets, which set_state restores
+        '''
+        return (self.get_board_copy(), set(self.frontier),
+                {players_color: set(moves) for players_color, moves in self.valid_moves.items()})
+
+    def set_state(self, state):
+        board, frontier, valid_moves = state
+        self.board = [row[:] for row in board]
+        self.frontier = set(frontier)
+        self.valid_moves = {players_color: set(moves) for players_color, moves in valid_moves.items()}
 
     def init_board(self):
         '''
@@ -37,17 +115,25 @@ class GameBoard(object):
         '''
 
         self.board[move[0]][move[1]] = players_color
+        changed = [(move[0], move[1])]
         dx = [-1,-1,-1,0,1,1,1,0]
         dy = [-1,0,1,1,1,0,-1,-1]
         for i in range(len(dx)):
             if self.confirm_direction(move,dx[i],dy[i],players_color):
-                self.change_stones_in_direction(move,dx[i],dy[i],players_color)
+                changed.extend(self.change_stones_in_direction(move,dx[i],dy[i],players_color))
+        self.update_moves(changed)
 
 
     def is_correct_move(self,move,players_color):
         '''
         Check if the move is correct
         '''
+        return (move[0], move[1]) in self.valid_moves[players_color]
+
+    def scan_move(self,move,players_color):
+        '''
+        Check if the move is correct by looking into all directions from it
+        '''
         if self.board[move[0]][move[1]] == self.empty_color:
             dx = [-1,-1,-1,0,1,1,1,0]
             dy = [-1,0,1,1,1,0,-1,-1]
@@ -88,23 +174,24 @@ class GameBoard(object):
         return False
 
     def change_stones_in_direction(self,move,dx,dy,players_color):
+        '''
+        :return: list of flipped stones
+        '''
+        changed = []
         posx = move[0]+dx
         posy = move[1]+dy
         while (not(self.board[posx][posy] == players_color)):
             self.board[posx][posy] = players_color
+            changed.append((posx, posy))
             posx += dx
             posy += dy
+        return changed
 
     def can_play(self, players_color):
         '''
         :return: True if there is a possible move for player
         '''
-        for x in range(self.board_size):
-            for y in range(self.board_size):
-                if self.is_correct_move([x,y], players_color):
-                    return True
-
-        return False
+        return len(self.valid_moves[players_color]) > 0
 
     def get_board_copy(self):
         return copy.deepcopy(self.board)
@@ -131,11 +218,7 @@ class GameBoard(object):
         print('')
 
     def get_all_valid_moves(self, players_color):
-        valid_moves = []
-        for x in range(self.board_size):
-            for y in range(self.board_size):
-                if (self.board[x][y] == -1) and self.is_correct_move([x, y], players_color):
-                    valid_moves.append((x, y))
+        valid_moves = sorted(self.valid_moves[players_color])
 
         if len(valid_moves) <= 0:
             print('No valid move!')
@@ -1,40 +1,62 @@
 # import random_player
 from game_board import GameBoard
+from bitboard import BitboardGameBoard
 import time, getopt, sys
 from player_creator import create_player
+from move_runner import MoveRunner
 
 class HeadlessReversiCreator(object):
     '''
     Creator of the Reversi game without the GUI.
     '''
 
-    def __init__(self, player1, player1_color, player2, player2_color, board_size=8):
+    def __init__(self, player1, player1_color, player2, player2_color, board_size=8, board_class=GameBoard,
+                 time_limit=None):
         '''
         :param player1: Instance of first player
         :param player1_color: color of player1
         :param player2: Instance of second player
         :param player1_color: color of player2
         :param boardSize: Board will have size [boardSize x boardSize]
+        :param board_class: GameBoard or BitboardGameBoard
+        :param time_limit: seconds for one move, moves are played in worker processes with a hard deadline,
+                           None plays them directly without a limit
         '''
-        self.board = GameBoard(board_size, player1_color, player2_color)
+        self.board = board_class(board_size, player1_color, player2_color)
         self.player1 = player1
         self.player2 = player2
         self.current_player = self.player1
         self.current_player_color = player1_color
         self.player1_color = player1_color
         self.player2_color = player2_color
+        self.time_limit = time_limit
+        self.runners = {}
+
+    def get_move(self):
+        '''
+        :return: (move of the current player, time of the move in ms, True if the deadline came before the move)
+        '''
+        if self.time_limit is None:
+            startTime = time.time()
+            move = self.current_player.move(self.board.get_board_copy())
+            return move, (time.time() - startTime) * 1000, False
+        if self.current_player_color not in self.runners:
+            self.runners[self.current_player_color] = MoveRunner(self.current_player, self.time_limit)
+        return self.runners[self.current_player_color].get_move(self.board.get_board_copy())
 
     def play_game(self):
         '''
         This function contains game loop that plays the game.
         '''
-        # TODO: Time limit for move
         correct_finish = True
         while self.board.can_play(self.current_player_color):
-            startTime = time.time()
-            move = self.current_player.move(self.board.get_board_copy())
-            endTime = time.time()
-            moveTime = (endTime - startTime) * 1000
+            move, moveTime, timed_out = self.get_move()
+            if timed_out and move is None:
+                print('Player %d move took too long - killed.' % (self.current_player_color))
+                correct_finish = False
+                break
+            elif timed_out:
+                print('Player %d ran out of time, its best move so far is played.' % (self.current_player_color))
             if move is None:
                 print('Player %d reurns None istead of a valid move. Move takes %.3f ms.' % (self.current_player_color, moveTime))
                 correct_finish = False
@@ -63,6 +85,8 @@ class HeadlessReversiCreator(object):
 
 
             self.board.print_board()
+        for runner in self.runners.values():
+            runner.close()
         if correct_finish:
             self.printFinalScore()
         else:
@@ -105,10 +129,17 @@ class HeadlessReversiCreator(object):
         print('\n-----------------------------\n\n')
 
 if __name__ == "__main__":
-    (choices,args) = getopt.getopt(sys.argv[1:],"")
+    (choices,args) = getopt.getopt(sys.argv[1:],"bt:")
     p1_color = 0
     p2_color = 1
     board_size = 8
+    # -b plays on the bitboard backend
+    board_class = BitboardGameBoard if ('-b', '') in choices else GameBoard
+    # -t seconds sets a hard time limit for one move
+    time_limit = None
+    for (option, value) in choices:
+        if option == '-t':
+            time_limit = float(value)
 
     importsCorrect = True
     colors = [p1_color, p2_color]
@@ -127,6 +158,6 @@ if __name__ == "__main__":
             print('Error: Cannot import given player: %s.' %(args[i]))
 
     if importsCorrect:
-        game = HeadlessReversiCreator(players[0], p1_color, players[1], p2_color, board_size)
+        game = HeadlessReversiCreator(players[0], p1_color, players[1], p2_color, board_size, board_class, time_limit)
         game.play_game()
 
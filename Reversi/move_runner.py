@@ -0,0 +1,87 @@
+import time
+import queue
+import traceback
+import multiprocessing
+from inspect import signature
+
+TIME_MARGIN = 0.1   # seconds of the limit kept for passing the board and the move between processes
+
+
+def accepts_time_left(player):
+    '''
+    :return: True if move of the player takes the time left for the move besides the board
+    '''
+    return len(signature(player.move).parameters) >= 2
+
+
+def serve_moves(player, requests, results):
+    '''
+    Loop of the worker process, plays moves of the player until it gets None.
+    Players may report their best move so far by calling on_best_move(move).
+    '''
+    player.on_best_move = lambda move: results.put(('best', move))
+    while True:
+        request = requests.get()
+        if request is None:
+            break
+        board, time_left = request
+        try:
+            if accepts_time_left(player):
+                move = player.move(board, time_left)
+            else:
+                move = player.move(board)
+        except Exception:
+            traceback.print_exc()
+            move = None
+        results.put(('move', move))
+
+
+class MoveRunner(object):
+    '''
+    Runs moves of one player in a worker process with a hard deadline. The player keeps its state
+    between moves. When the deadline comes first, the best move the player reported so far is used
+    and the worker is replaced by a new one with the player as it was given.
+    '''
+
+    def __init__(self, player, time_limit):
+        '''
+        :param player: Instance of the player
+        :param time_limit: seconds for one move
+        '''
+        self.player = player
+        self.time_limit = time_limit
+        self.process = None
+        self.start()
+
+    def start(self):
+        self.requests = multiprocessing.Queue()
+        self.results = multiprocessing.Queue()
+        self.process = multiprocessing.Process(target=serve_moves, args=(self.player, self.requests, self.results),
+                                               daemon=True)
+        self.process.start()
+
+    def close(self):
+        if self.process is not None and self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+        self.process = None
+
+    def get_move(self, board):
+        '''
+        :param board: copy of the game board
+        :return: (move or None, time of the move in ms, True if the deadline came before the move)
+        '''
+        start_time = time.time()
+        deadline = start_time + self.time_limit
+        self.requests.put((board, self.time_limit - TIME_MARGIN))
+        best_move = None
+        while True:
+            try:
+                kind, move = self.results.get(timeout=max(deadline - time.time(), 0.001))
+            except queue.Empty:
+                self.close()
+                self.start()
+                return best_move, (time.time() - start_time) * 1000, True
+            if kind == 'move':
+                return move, (time.time() - start_time) * 1000, False
+            best_move = move
@@ -0,0 +1,116 @@
+'''
+Perft benchmark of move generation: counts all positions reachable in given number of moves
+with the list GameBoard and with the bitboard functions and compares their speed.
+Then both boards play the same random games with the calls of the game loop of the creators.
+
+usage: python perft.py [depth] [board_size]
+'''
+
+import sys
+import time
+import random
+from game_board import GameBoard
+from bitboard import BitboardGameBoard, get_moves, get_flips
+
+GAMES = 200
+
+
+def perft_board(board, players_color, opponents_color, depth, passed=False):
+    '''
+    :return: (number of leaf positions, number of generated moves) of the game tree of the given depth
+    '''
+    if depth == 0:
+        return 1, 0
+    moves = [(x, y) for x in range(board.board_size) for y in range(board.board_size)
+             if board.is_correct_move((x, y), players_color)]
+    if not moves:
+        if passed:
+            return 1, 0     # game over
+        return perft_board(board, opponents_color, players_color, depth - 1, True)
+    leaves, generated = 0, len(moves)
+    for move in moves:
+        saved = board.get_state()
+        board.play_move(move, players_color)
+        child_leaves, child_generated = perft_board(board, opponents_color, players_color, depth - 1)
+        leaves += child_leaves
+        generated += child_generated
+        board.set_state(saved)
+    return leaves, generated
+
+
+def perft_bits(own, opponent, board_size, depth, passed=False):
+    '''
+    :return: (number of leaf positions, number of generated moves) of the game tree of the given depth
+    '''
+    if depth == 0:
+        return 1, 0
+    moves = get_moves(own, opponent, board_size)
+    if not moves:
+        if passed:
+            return 1, 0     # game over
+        return perft_bits(opponent, own, board_size, depth - 1, True)
+    leaves, generated = 0, 0
+    while moves:
+        move = moves & -moves
+        moves ^= move
+        flips = get_flips(move, own, opponent, board_size)
+        child_leaves, child_generated = perft_bits(opponent & ~flips, own | move | flips, board_size, depth - 1)
+        leaves += child_leaves
+        generated += child_generated + 1
+    return leaves, generated
+
+
+def play_random_games(board_class, board_size, games):
+    '''
+    :return: total number of played moves
+    '''
+    moves = 0
+    for seed in range(games):
+        rng = random.Random(seed)
+        board = board_class(board_size)
+        players_color, opponents_color = board.p1_color, board.p2_color
+        while board.can_play(players_color):
+            move = rng.choice(board.get_all_valid_moves(players_color))
+            if board.is_correct_move(move, players_color):
+                board.play_move(move, players_color)
+                moves += 1
+            players_color, opponents_color = opponents_color, players_color
+            if not board.can_play(players_color):
+                players_color, opponents_color = opponents_color, players_color
+                board.can_play(players_color)
+    return moves
+
+
+def main():
+    depth = int(sys.argv[1]) if len(sys.argv) > 1 else 6
+    board_size = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+
+    board = GameBoard(board_size)
+    start_time = time.perf_counter()
+    list_leaves, list_generated = perft_board(board, board.p1_color, board.p2_color, depth)
+    list_time = time.perf_counter() - start_time
+
+    board = BitboardGameBoard(board_size)
+    start_time = time.perf_counter()
+    bits_leaves, bits_generated = perft_bits(board.bits[board.p1_color], board.bits[board.p2_color], board_size,
+                                             depth)
+    bits_time = time.perf_counter() - start_time
+
+    print('perft(%d) on %dx%d board' % (depth, board_size, board_size))
+    print('%-10s %12s %12s %12s %14s' % ('board', 'leaves', 'moves', 'time [s]', 'moves/s'))
+    print('%-10s %12d %12d %12.3f %14.0f' % ('list', list_leaves, list_generated, list_time,
+                                             list_generated / list_time))
+    print('%-10s %12d %12d %12.3f %14.0f' % ('bitboard', bits_leaves, bits_generated, bits_time,
+                                             bits_generated / bits_time))
+
+    print('\n%d random games' % GAMES)
+    print('%-10s %12s %12s %14s' % ('board', 'moves', 'time [s]', 'moves/s'))
+    for name, board_class in (('list', GameBoard), ('bitboard', BitboardGameBoard)):
+        start_time = time.perf_counter()
+        moves = play_random_games(board_class, board_size, GAMES)
+        game_time = time.perf_counter() - start_time
+        print('%-10s %12d %12.3f %14.0f' % (name, moves, game_time, moves / game_time))
+
+
+if __name__ == "__main__":
+    main()
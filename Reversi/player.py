@@ -1,13 +1,36 @@
+import time
+import random
+
+
+class SearchTimeout(Exception):
+    pass
+
+
 class MyPlayer():
     '''
     Best move is chosen based on a risk of each position on the board.
+
+    With SEARCH and a time given for the move the player looks ahead by iterative-deepening negamax
+    with alpha-beta pruning, the risk of positions is then the evaluation of leaf positions and orders the moves.
+    Without a time the move is the instant one-ply greedy one.
     '''
 
+    SEARCH = True           # False for the one-ply greedy player
+    TIME_LIMIT = 4.0        # maximal seconds of the search, MAX_TIME_FOR_MOVE of reversi_creator is 5
+    MAX_DEPTH = 60
+    TT_SIZE = 1 << 18       # number of transposition table slots, a power of two
+    CHECK_INTERVAL = 256    # number of searched nodes between time checks
+    VERBOSE = False         # print depth and nodes per second after every move
+
     def __init__(self, my_color,opponent_color, board_size=8):
         self.name = 'kopliric' 
         self.my_color = my_color
         self.opponent_color = opponent_color
         self.board_size = board_size
+        self.stats = {}     # depth, nodes, time and nodes per second of the last search
+        self.on_best_move = None    # called with the best move after every finished depth, set by move_runner
+        if self.SEARCH:
+            self.init_search()
     
     def get_score(self, x, y, stones_inverted):
         '''
@@ -72,7 +95,7 @@ class MyPlayer():
 
         return score
 
-    def move(self,board):
+    def move(self,board, time_left=None):
         '''
         Strategy:
             * always choose a corner if possible;
@@ -80,9 +103,12 @@ class MyPlayer():
             * avoid moves that allow an opponent to get to the corners and edges.
 
         :param board: game board
+        :param time_left: seconds left for the move given by the game runner, None for the greedy move
         :return: position on the board for the next move as tuple
         '''
-        
+        if self.SEARCH and time_left is not None:
+            return self.search(board, time_left)
+
         valid_moves = self.get_all_valid_moves(board)
 
         #evaluate a score for each possible move and choose the one with the highest score
@@ -135,4 +161,211 @@ class MyPlayer():
             print('No possible move!')
             return None
         return valid_moves
-    
+
+    def init_search(self):
+        '''
+        Prepares bitboard shifts, weights of squares, Zobrist keys and the transposition table.
+        Square [x,y] is the bit x*board_size+y of a bitboard.
+        '''
+        n = self.board_size
+        self.full = (1 << n * n) - 1
+        first_column = 0
+        for x in range(n):
+            first_column |= 1 << (x * n)
+        not_first = self.full & ~first_column
+        not_last = self.full & ~(first_column << (n - 1))
+        self.directions = [(-n - 1, not_last), (-n, self.full), (-n + 1, not_first), (1, not_first),
+                           (n + 1, not_first), (n, self.full), (n - 1, not_last), (-1, not_last)]
+
+        # squares grouped by their risk from get_score, evaluation counts stones in every group
+        self.square_weights = [self.get_score(x, y, 0) for x in range(n) for y in range(n)]
+        self.weight_masks = {}
+        for square, weight in enumerate(self.square_weights):
+            self.weight_masks[weight] = self.weight_masks.get(weight, 0) | (1 << square)
+
+        rng = random.Random(n)
+        self.zobrist = [[rng.getrandbits(64) for _ in range(n * n)] for _ in range(2)]
+        self.zobrist_side = rng.getrandbits(64)
+        self.table = [None] * self.TT_SIZE     # slot: (hash, depth, value, bound, best move)
+
+    def shift(self, bits, direction):
+        amount, mask = direction
+        if amount > 0:
+            return (bits << amount) & mask
+        return (bits >> -amount) & mask
+
+    def get_moves(self, own, opponent):
+        '''
+        :return: bitboard of all correct moves of the player with own stones
+        '''
+        empty = ~(own | opponent) & self.full
+        moves = 0
+        for direction in self.directions:
+            line = self.shift(own, direction) & opponent
+            for _ in range(self.board_size - 3):
+                line |= self.shift(line, direction) & opponent
+            moves |= self.shift(line, direction) & empty
+        return moves
+
+    def get_flips(self, move, own, opponent):
+        '''
+        :return: bitboard of opponent stones flipped by the move
+        '''
+        flips = 0
+        for direction in self.directions:
+            line = 0
+            square = self.shift(move, direction)
+            while square & opponent:
+                line |= square
+                square = self.shift(square, direction)
+            if square & own:
+                flips |= line
+        return flips
+
+    def evaluate(self, own, opponent):
+        '''
+        :return: sum of risks of squares with own stones minus the opponent ones
+        '''
+        value = 0
+        for weight, mask in self.weight_masks.items():
+            value += weight * (bin(own & mask).count('1') - bin(opponent & mask).count('1'))
+        return value
+
+    def get_ordered_moves(self, moves, best_move):
+        '''
+        :return: list of squares of the moves, best_move of the table first, then by risk of squares
+        '''
+        squares = []
+        while moves:
+            move = moves & -moves
+            squares.append(move.bit_length() - 1)
+            moves ^= move
+        squares.sort(key=lambda square: (square != best_move, -self.square_weights[square]))
+        return squares
+
+    def negamax(self, own, opponent, side, key, depth, alpha, beta, passed=False):
+        '''
+        :param side: 0 if own stones are of my color, 1 otherwise
+        :param key: Zobrist hash of the position
+        :return: value of the position for the player with own stones
+        '''
+        self.nodes += 1
+        if self.nodes % self.CHECK_INTERVAL == 0 and time.perf_counter() > self.deadline:
+            raise SearchTimeout()
+
+        moves = self.get_moves(own, opponent)
+        if not moves:
+            if passed or not self.get_moves(opponent, own):
+                # game over, stones are worth more than any risk of squares
+                return 10000 * (bin(own).count('1') - bin(opponent).count('1'))
+            return -self.negamax(opponent, own, 1 - side, key ^ self.zobrist_side, depth, -beta, -alpha, True)
+        if depth == 0:
+            return self.evaluate(own, opponent)
+
+        slot = key & (self.TT_SIZE - 1)
+        entry = self.table[slot]
+        best_move = None
+        if entry is not None and entry[0] == key:
+            best_move = entry[4]
+            if entry[1] >= depth:
+                value, bound = entry[2], entry[3]
+                if bound == 0 or (bound < 0 and value <= alpha) or (bound > 0 and value >= beta):
+                    return value
+
+        original_alpha = alpha
+        best_value = -float('inf')
+        for square in self.get_ordered_moves(moves, best_move):
+            move = 1 << square
+            flips = self.get_flips(move, own, opponent)
+            child_key = key ^ self.zobrist_side ^ self.zobrist[side][square]
+            flipped = flips
+            while flipped:
+                bit = flipped & -flipped
+                flipped_square = bit.bit_length() - 1
+                child_key ^= self.zobrist[side][flipped_square] ^ self.zobrist[1 - side][flipped_square]
+                flipped ^= bit
+            value = -self.negamax(opponent & ~flips, own | move | flips, 1 - side, child_key, depth - 1,
+                                  -beta, -alpha)
+            if value > best_value:
+                best_value = value
+                best_move = square
+            alpha = max(alpha, value)
+            if alpha >= beta:
+                break
+
+        # bound: -1 upper bound, 0 exact value, 1 lower bound, deeper entries are kept
+        bound = -1 if best_value <= original_alpha else (1 if best_value >= beta else 0)
+        if entry is None or entry[0] != key or entry[1] <= depth:
+            self.table[slot] = (key, depth, best_value, bound, best_move)
+        return best_value
+
+    def report_best_move(self, square):
+        if self.on_best_move is not None:
+            self.on_best_move(divmod(square, self.board_size))
+
+    def search(self, board, time_left=None):
+        '''
+        Iterative deepening, the move of the deepest finished search is returned when the time is up.
+        :param board: game board
+        :param time_left: seconds left for the move, TIME_LIMIT if None
+        :return: position on the board for the next move as tuple
+        '''
+        start_time = time.perf_counter()
+        time_limit = self.TIME_LIMIT if time_left is None else min(self.TIME_LIMIT, time_left)
+        self.deadline = start_time + time_limit
+        self.nodes = 0
+        own, opponent, key = 0, 0, 0
+        for x in range(self.board_size):
+            for y in range(self.board_size):
+                square = x * self.board_size + y
+                if board[x][y] == self.my_color:
+                    own |= 1 << square
+                    key ^= self.zobrist[0][square]
+                elif board[x][y] == self.opponent_color:
+                    opponent |= 1 << square
+                    key ^= self.zobrist[1][square]
+
+        moves = self.get_moves(own, opponent)
+        if not moves:
+            print('No possible move!')
+            return None
+        squares = self.get_ordered_moves(moves, None)
+        best_square = squares[0]
+        self.report_best_move(best_square)
+        depth = 0
+        try:
+            for depth in range(1, self.MAX_DEPTH + 1):
+                best_value = -float('inf')
+                alpha = -float('inf')
+                for square in squares:
+                    move = 1 << square
+                    flips = self.get_flips(move, own, opponent)
+                    child_key = key ^ self.zobrist_side ^ self.zobrist[0][square]
+                    flipped = flips
+                    while flipped:
+                        bit = flipped & -flipped
+                        flipped_square = bit.bit_length() - 1
+                        child_key ^= self.zobrist[0][flipped_square] ^ self.zobrist[1][flipped_square]
+                        flipped ^= bit
+                    value = -self.negamax(opponent & ~flips, own | move | flips, 1, child_key, depth - 1,
+                                          -float('inf'), -alpha)
+                    if value > best_value:
+                        best_value = value
+                        depth_best_square = square
+                    alpha = max(alpha, value)
+                best_square = depth_best_square
+                self.report_best_move(best_square)
+                # the best move of this depth is searched first in the next one
+                squares.remove(best_square)
+                squares.insert(0, best_square)
+                if abs(best_value) >= 10000 or depth >= bin(~(own | opponent) & self.full).count('1'):
+                    break   # the result of the game is known
+        except SearchTimeout:
+            depth -= 1
+
+        elapsed = time.perf_counter() - start_time
+        self.stats = {'depth': depth, 'nodes': self.nodes, 'time': elapsed,
+                      'nodes_per_second': self.nodes / max(elapsed, 1e-9)}
+        if self.VERBOSE:
+            print('depth %d, %d nodes, %.0f nodes/s' % (depth, self.nodes, self.stats['nodes_per_second']))
+        return divmod(best_square, self.board_size)
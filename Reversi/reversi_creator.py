@@ -9,6 +9,7 @@ import time
 import getopt
 import sys
 import player_creator
+from move_runner import MoveRunner
 
 BOARD_SIZE = 8
 MAX_TIME_FOR_MOVE = 5
@@ -31,6 +32,7 @@ class ReversiCreator(object):
         self.player2 = player_creator.create_player(players[-1], self.player2_color, self.player1_color, BOARD_SIZE)
         self.board = GameBoard(board_size=BOARD_SIZE)
         self.sleep_time_ms = 200
+        self.runners = {}
         self.gui = ReversiView(players=player_array, boardSize=BOARD_SIZE)
         self.gui.set_game(self)
         self.gui.set_board(self.board)
@@ -71,6 +73,18 @@ class ReversiCreator(object):
 
         
 
+    def get_runner(self):
+        '''
+        Returns the MoveRunner of the current player, a new one if the player was changed in the GUI.
+        '''
+        runner = self.runners.get(self.current_player_color)
+        if runner is None or runner.player is not self.current_player:
+            if runner is not None:
+                runner.close()
+            runner = MoveRunner(self.current_player, MAX_TIME_FOR_MOVE)
+            self.runners[self.current_player_color] = runner
+        return runner
+
     def play_game(self, interactivePlayerColor=-1):
         '''
         This function contains game loop that plays the game. Loop is exited when paused or interactive game.
@@ -87,38 +101,19 @@ class ReversiCreator(object):
                 inform_str = 'It is your turn'
                 self.gui.inform(inform_str, 'green')
                 break
-            #q = multiprocessing.Queue()
-            #p = multiprocessing.Process(target=self.get_player_move, args=(q,))
-            #p.start()
-            # Wait for 1 second
-            #p.join(1)
-            #if p.is_alive():
-            #    print("running too long - killing it")
-            #    p.terminate()
-            #    p.join()
-            #    player_move_overtime = self.current_player_color
-            #if player_move_overtime != -1:
-            #    inform_str = 'Player %d move took to long - killed' % (self.current_player_color)
-            #    self.gui.inform(inform_str, 'red')
-            #    break
-            #returned_move = q.get()
-            #move_time = returned_move['time']
-            #move = returned_move['move']
-            
-            start_time = time.time()
-            move = self.current_player.move(self.board.get_board_copy())
-            endTime = time.time()
-            move_time = (endTime - start_time) * 1000
-            
-            if move_time > MAX_TIME_FOR_MOVE * 1000:
+            # the move is computed in a worker process, at the deadline its best move so far is taken
+            move, move_time, timed_out = self.get_runner().get_move(self.board.get_board_copy())
+            if timed_out and move is None:
                 print("running too long - killing it")
                 player_move_overtime = self.current_player_color
-            
+            elif timed_out:
+                print('Player %d ran out of time, its best move so far is played.' % (self.current_player_color))
+
             if player_move_overtime != -1:
                 inform_str = 'Player %d move took to long - killed' % (self.current_player_color)
                 self.gui.inform(inform_str, 'red')
                 break
-            
+
             self.max_times_ms[self.current_player_color] = max(self.max_times_ms[self.current_player_color], move_time)
             if move is None:
                 print('Move is not correct!!!!')
@@ -0,0 +1,293 @@
+'''
+Round robin tournament of player modules. Every pair of players plays every opening twice with swapped
+colors, the games are spread across a pool of worker processes. Win/draw/loss, disc differential,
+Elo and percentiles of move times of every player are printed and saved as a JSON report.
+
+usage: python tournament.py player another_player [more_players] -n 4 -p 4 -t 1 -r report.json
+'''
+
+import math
+import json
+import time
+import random
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from game_board import GameBoard
+from bitboard import BitboardGameBoard
+from player_creator import create_player
+from move_runner import MoveRunner
+
+BOARD_SIZE = 8
+PERCENTILES = [50, 90, 99, 100]
+ELO_ITERATIONS = 1000
+
+
+def setup_arg_parser():
+    parser = argparse.ArgumentParser(description='Play a round robin tournament of Reversi players.')
+    parser.add_argument('players', nargs='+', help='modules with the MyPlayer class, at least two')
+    parser.add_argument('-n', '--openings', type=int, default=4,
+                        help='number of random openings, every one is played twice by every pair')
+    parser.add_argument('-p', '--plies', type=int, default=4, help='number of moves of a random opening')
+    parser.add_argument('-k', '--book', help='file with the opening book instead of random openings, '
+                                             'one opening per line as moves x,y separated by spaces')
+    parser.add_argument('-s', '--seed', type=int, default=0, help='seed of the random openings')
+    parser.add_argument('-t', '--time-limit', type=float, default=None,
+                        help='seconds for one move, moves are played with a hard deadline in move runners')
+    parser.add_argument('-b', '--bitboard', action='store_true', help='play on BitboardGameBoard')
+    parser.add_argument('-w', '--workers', type=int, default=None, help='number of worker processes')
+    parser.add_argument('-r', '--report', metavar='filepath', default='tournament.json',
+                        help='path of the output .json file with the report')
+    return parser
+
+
+def get_module_name(player):
+    return player[:-3] if player.endswith('.py') else player
+
+
+def play_random_opening(rng, plies, board_size):
+    '''
+    :return: list of plies random correct moves from the initial position
+    '''
+    board = GameBoard(board_size)
+    players_color, opponents_color = board.p1_color, board.p2_color
+    moves = []
+    while len(moves) < plies and board.can_play(players_color):
+        move = rng.choice(board.get_all_valid_moves(players_color))
+        board.play_move(move, players_color)
+        moves.append(move)
+        players_color, opponents_color = opponents_color, players_color
+        if not board.can_play(players_color):
+            players_color, opponents_color = opponents_color, players_color
+    return moves
+
+
+def load_book(path):
+    '''
+    :return: list of openings, an opening is a list of moves (x, y)
+    '''
+    openings = []
+    with open(path) as file:
+        for line in file:
+            line = line.split('#')[0].strip()
+            if line:
+                openings.append([tuple(int(c) for c in move.split(',')) for move in line.split()])
+    return openings
+
+
+def get_jobs(players, openings, board_size, time_limit, bitboard):
+    '''
+    :return: list of games as (first player, second player, opening index, opening, board size, time limit,
+             bitboard), the first player plays with color 0 and moves first
+    '''
+    jobs = []
+    for i in range(len(players)):
+        for j in range(i + 1, len(players)):
+            for index, opening in enumerate(openings):
+                jobs.append((players[i], players[j], index, opening, board_size, time_limit, bitboard))
+                jobs.append((players[j], players[i], index, opening, board_size, time_limit, bitboard))
+    return jobs
+
+
+def get_move(player, runner, board):
+    '''
+    :return: (move, time of the move in ms, True if the deadline came before the move)
+    '''
+    if runner is not None:
+        return runner.get_move(board.get_board_copy())
+    start_time = time.perf_counter()
+    move = player.move(board.get_board_copy())
+    return move, (time.perf_counter() - start_time) * 1000, False
+
+
+def play_game(job):
+    '''
+    Plays one game quietly, a player loses all stones left on the board by a wrong move, None or overtime.
+    :param job: one game from get_jobs
+    :return: dictionary with the result of the game and times of all moves of both players
+    '''
+    first, second, opening_index, opening, board_size, time_limit, bitboard = job
+    board_class = BitboardGameBoard if bitboard else GameBoard
+    board = board_class(board_size)
+    colors = [board.p1_color, board.p2_color]
+    names = [first, second]
+    players = [create_player(__import__(name).MyPlayer, colors[i], colors[1 - i], board_size)
+               for i, name in enumerate(names)]
+    runners = [MoveRunner(player, time_limit) if time_limit is not None else None for player in players]
+    move_times = [[], []]
+    current = 0
+    forfeit = None
+    timeouts = [0, 0]
+
+    for move in opening:
+        if not board.can_play(colors[current]):
+            current = 1 - current
+        if not board.is_correct_move(move, colors[current]):
+            raise ValueError('wrong opening move [%d,%d] in opening %d' % (move[0], move[1], opening_index))
+        board.play_move(move, colors[current])
+        current = 1 - current
+    if not board.can_play(colors[current]):
+        current = 1 - current
+
+    while board.can_play(colors[current]):
+        move, move_time, timed_out = get_move(players[current], runners[current], board)
+        move_times[current].append(move_time)
+        timeouts[current] += timed_out
+        if move is None or not board.is_correct_move((int(move[0]), int(move[1])), colors[current]):
+            forfeit = {'player': names[current], 'reason': 'overtime' if timed_out else 'wrong move'}
+            break
+        board.play_move((int(move[0]), int(move[1])), colors[current])
+        current = 1 - current
+        if not board.can_play(colors[current]):
+            current = 1 - current
+    for runner in runners:
+        if runner is not None:
+            runner.close()
+
+    score = board.get_score()
+    if forfeit is not None:
+        # the player who forfeited loses all stones left on the board
+        loser = names.index(forfeit['player'])
+        score[1 - loser] = sum(score)
+        score[loser] = 0
+    return {'first': first, 'second': second, 'opening': opening_index, 'score': score, 'forfeit': forfeit,
+            'timeouts': timeouts, 'move_times': move_times}
+
+
+def run_games(jobs, workers=None):
+    '''
+    :return: list of results of play_game in order of the jobs
+    '''
+    if workers == 1:
+        return [play_game(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(play_game, jobs))
+
+
+def percentile(values, q):
+    '''
+    :return: nearest-rank percentile q of the values, None for no values
+    '''
+    if not values:
+        return None
+    values = sorted(values)
+    return values[max(0, math.ceil(q / 100.0 * len(values)) - 1)]
+
+
+def get_elo(players, games):
+    '''
+    Ratings of the Bradley-Terry model fitted to all games, draws count as half wins. Every player also has
+    a virtual draw against a player of rating 0, so ratings stay finite when a player wins or loses everything.
+    :return: dictionary player -> Elo rating, the mean rating is 0
+    '''
+    scores = {player: 0.5 for player in players}
+    pairs = {player: {} for player in players}
+    for game in games:
+        first, second = game['first'], game['second']
+        result = get_result(game)
+        scores[first] += result
+        scores[second] += 1 - result
+        pairs[first][second] = pairs[first].get(second, 0) + 1
+        pairs[second][first] = pairs[second].get(first, 0) + 1
+
+    strengths = {player: 1.0 for player in players}
+    for _ in range(ELO_ITERATIONS):
+        new_strengths = {}
+        for player in players:
+            denominator = 1.0 / (strengths[player] + 1.0)
+            for opponent, count in pairs[player].items():
+                denominator += count / (strengths[player] + strengths[opponent])
+            new_strengths[player] = scores[player] / denominator
+        strengths = new_strengths
+    ratings = {player: 400 * math.log10(strengths[player]) for player in players}
+    mean = sum(ratings.values()) / len(ratings)
+    return {player: ratings[player] - mean for player in players}
+
+
+def get_result(game):
+    '''
+    :return: score of the first player of the game, 1 for win, 0.5 for draw and 0 for loss
+    '''
+    first_stones, second_stones = game['score']
+    if first_stones > second_stones:
+        return 1.0
+    if first_stones < second_stones:
+        return 0.0
+    return 0.5
+
+
+def aggregate(players, games):
+    '''
+    :return: dictionary player -> statistics of the player over all games
+    '''
+    stats = {player: {'games': 0, 'wins': 0, 'draws': 0, 'losses': 0, 'disc_differential': 0, 'forfeits': 0,
+                      'timeouts': 0, 'move_times': []} for player in players}
+    for game in games:
+        result = get_result(game)
+        for side, player in enumerate((game['first'], game['second'])):
+            player_stats = stats[player]
+            player_result = result if side == 0 else 1 - result
+            player_stats['games'] += 1
+            if player_result == 1:
+                player_stats['wins'] += 1
+            elif player_result == 0:
+                player_stats['losses'] += 1
+            else:
+                player_stats['draws'] += 1
+            player_stats['disc_differential'] += game['score'][side] - game['score'][1 - side]
+            player_stats['forfeits'] += game['forfeit'] is not None and game['forfeit']['player'] == player
+            player_stats['timeouts'] += game['timeouts'][side]
+            player_stats['move_times'].extend(game['move_times'][side])
+
+    elo = get_elo(players, games)
+    for player in players:
+        player_stats = stats[player]
+        move_times = player_stats.pop('move_times')
+        player_stats['score'] = player_stats['wins'] + 0.5 * player_stats['draws']
+        player_stats['elo'] = elo[player]
+        player_stats['moves'] = len(move_times)
+        player_stats['move_time_ms'] = {'p%d' % q: percentile(move_times, q) for q in PERCENTILES}
+    return stats
+
+
+def print_table(stats):
+    print('%-20s %6s %5s %5s %5s %7s %8s %7s %10s %10s' % ('player', 'games', 'win', 'draw', 'loss', 'score',
+                                                          'discs', 'elo', 'p50 [ms]', 'max [ms]'))
+    for player in sorted(stats, key=lambda player: -stats[player]['elo']):
+        player_stats = stats[player]
+        times = player_stats['move_time_ms']
+        print('%-20s %6d %5d %5d %5d %7.1f %+8d %+7.0f %10.1f %10.1f' % (
+            player, player_stats['games'], player_stats['wins'], player_stats['draws'], player_stats['losses'],
+            player_stats['score'], player_stats['disc_differential'], player_stats['elo'],
+            times['p50'] or 0, times['p100'] or 0))
+
+
+def main():
+    parser = setup_arg_parser()
+    args = parser.parse_args()
+    players = [get_module_name(player) for player in args.players]
+    if len(set(players)) < 2:
+        parser.error('at least two different players are needed')
+    if args.book:
+        openings = load_book(args.book)
+    else:
+        rng = random.Random(args.seed)
+        openings = [play_random_opening(rng, args.plies, BOARD_SIZE) for _ in range(args.openings)]
+    jobs = get_jobs(players, openings, BOARD_SIZE, args.time_limit, args.bitboard)
+
+    start_time = time.perf_counter()
+    games = run_games(jobs, args.workers)
+    elapsed = time.perf_counter() - start_time
+    print('%d games played in %.3f s' % (len(games), elapsed))
+    stats = aggregate(players, games)
+    print_table(stats)
+
+    report = {'settings': {'players': players, 'openings': openings, 'board_size': BOARD_SIZE,
+                           'time_limit': args.time_limit, 'bitboard': args.bitboard, 'time': elapsed},
+              'players': stats,
+              'games': [{key: game[key] for key in game if key != 'move_times'} for game in games]}
+    with open(args.report, 'w') as file:
+        json.dump(report, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+'''
+Benchmark of the batched k-NN classifier against the classifier comparing one test image at a time
+
+usage: python benchmark.py [train_zip] [k]
+'''
+
+import os
+import sys
+import time
+import numpy as np
+from knn import load_train_dataset, knn_classifier, knn_classify_batch, read_truth, read_images, PCAIndex, \
+    knn_classify_indexed
+
+TEST_STEP = 5   # every TEST_STEP-th image is classified with the rest as the training set, truth.dsv is sorted
+
+
+def main():
+    zip_path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                                  'train_1000_28.zip')
+    k = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    images, labels, _ = load_train_dataset(zip_path, cache_dir=None)
+    test = np.arange(len(images)) % TEST_STEP == 0
+    images_train, labels_train = images[~test], labels[~test]
+    images_test, labels_test = images[test], labels[test]
+
+    start_time = time.perf_counter()
+    loop_labels = np.array([knn_classifier(images_train, labels_train, k, image) for image in images_test])
+    loop_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    batch_labels = knn_classify_batch(images_train, labels_train, k, images_test)
+    batch_time = time.perf_counter() - start_time
+
+    print('%d training and %d test images of %d pixels, k = %d' % (len(images_train), len(images_test),
+                                                                   images.shape[1], k))
+    print('%-10s %12s %12s' % ('', 'time [s]', 'queries/s'))
+    print('%-10s %12.4f %12.0f' % ('loop', loop_time, len(images_test) / loop_time))
+    print('%-10s %12.4f %12.0f' % ('batch', batch_time, len(images_test) / batch_time))
+    print('speedup %.1fx, identical labels: %s' % (loop_time / batch_time, np.array_equal(loop_labels, batch_labels)))
+
+    start_time = time.perf_counter()
+    index = PCAIndex(images_train)
+    build_time = time.perf_counter() - start_time
+    start_time = time.perf_counter()
+    indexed_labels = knn_classify_indexed(index, labels_train, k, images_test)
+    indexed_time = time.perf_counter() - start_time
+    print('%-10s %12s %12s %12s %12s' % ('search', 'build [s]', 'queries/s', 'accuracy', 'distances'))
+    print('%-10s %12.4f %12.0f %12.3f %12.3f' % ('brute', 0, len(images_test) / batch_time,
+                                                 np.mean(batch_labels == labels_test), 1))
+    print('%-10s %12.4f %12.0f %12.3f %12.3f' % ('pca', build_time, len(images_test) / indexed_time,
+                                                 np.mean(indexed_labels == labels_test),
+                                                 index.computed / (len(images_test) * len(images_train))))
+
+    # cold load without the dataset cache, decoded straight from the archive
+    filenames = read_truth(zip_path)[:, 0]
+    print('%-10s %12s %12s' % ('workers', 'load [s]', 'images/s'))
+    for workers in sorted({1, os.cpu_count()}):
+        start_time = time.perf_counter()
+        read_images(zip_path, filenames, workers)
+        load_time = time.perf_counter() - start_time
+        print('%-10d %12.4f %12.0f' % (workers, load_time, len(filenames) / load_time))
+
+
+if __name__ == "__main__":
+    main()
@@ -6,43 +6,153 @@ contact: kopliric@fel.cvut.cz
 date: 28/05/2023
 '''
 
+import io
 import os
 import csv
 import string
+import hashlib
+import zipfile
 import argparse
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 from PIL import Image
 import numpy as np
 
+CHUNK_SIZE = 256    # test images compared with the training set at once
+DECODE_CHUNK_SIZE = 256     # images decoded by one task of a worker process
+SEARCH_MODES = ('brute', 'pca')
+PCA_COMPONENTS = 16     # dimension of the projection giving lower bounds of distances
+PCA_CANDIDATES = 64     # training images with the lowest bounds whose distance is computed first
+MAX_K = 20      # the largest k tried by choose_k
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dataset_cache')
+
 
 def setup_arg_parser():
     parser = argparse.ArgumentParser(description='Learn and classify image data.')
-    parser.add_argument('train_path', type=str, help='path to the training data directory')
-    parser.add_argument('test_path', type=str, help='path to the testing data directory')
+    parser.add_argument('train_path', type=str, help='path to the training data directory or .zip archive')
+    parser.add_argument('test_path', type=str, help='path to the testing data directory or .zip archive')
     parser.add_argument('-k', type=int, default=4, 
-                        help='run k-NN classifier (if k is 0 the code may decide about proper K by itself')
+                        help='run k-NN classifier (if k is 0 the code chooses k by leave-one-out cross-validation)')
+    parser.add_argument('-s', '--search', choices=SEARCH_MODES, default='brute',
+                        help='neighbour search: brute compares with all training images, pca skips the ones '
+                             'which are surely farther by their PCA projections, both give the same neighbours')
     parser.add_argument("-o", metavar='filepath', 
                         default='classification.dsv',
                         help="path (including the filename) of the output .dsv file with the results")
     return parser
 
-def load_train_dataset(directory):
-    images = []
-    labels = []
+def get_cache_prefix(directory, kind, cache_dir):
+    # the key changes whenever a file is added, removed or renamed in the directory or truth.dsv changes
+    directory = os.path.abspath(directory)
+    key = '%s:%s:%d' % (directory, kind, os.stat(directory).st_mtime_ns)
+    truth_path = os.path.join(directory, 'truth.dsv')
+    if os.path.exists(truth_path):
+        key += ':%d' % os.stat(truth_path).st_mtime_ns
+    name = os.path.basename(os.path.normpath(directory))
+    return os.path.join(cache_dir, '%s_%s_%s' % (name, kind, hashlib.md5(key.encode()).hexdigest()[:12]))
 
-    with open(os.path.join(directory, 'truth.dsv'), 'r') as file:
-        reader = csv.reader(file, delimiter=':')
-        for row in reader:
-            filename = row[0]
-            label = row[1]
+def load_dataset_cache(prefix):
+    # returns (images memory-mapped from the cache, array of names) or None if the cache does not exist
+    if not os.path.exists(prefix + '_images.npy') or not os.path.exists(prefix + '_names.npy'):
+        return None
+    return np.load(prefix + '_images.npy', mmap_mode='r'), np.load(prefix + '_names.npy')
+
+def save_dataset_cache(prefix, images, names):
+    os.makedirs(os.path.dirname(prefix), exist_ok=True)
+    for suffix, array in (('_names.npy', names), ('_images.npy', images)):
+        temporary_path = prefix + suffix + '.tmp'
+        with open(temporary_path, 'wb') as file:
+            np.save(file, array)
+        os.replace(temporary_path, prefix + suffix)    # other runs never see a half written file
+
+def is_archive(path):
+    return os.path.isfile(path) and zipfile.is_zipfile(path)
+
+def list_archive(archive):
+    # returns the folder of the dataset inside the archive (the one with truth.dsv or the first one)
+    # and names of the files in it in the order of the archive
+    members = [member for member in archive.namelist() if not member.endswith('/')]
+    truth_members = [member for member in members if os.path.basename(member) == 'truth.dsv']
+    if truth_members:
+        root = os.path.dirname(truth_members[0])
+    else:
+        root = os.path.dirname(members[0]) if members else ''
+    prefix = root + '/' if root else ''
+    filenames = [member[len(prefix):] for member in members
+                 if member.startswith(prefix) and '/' not in member[len(prefix):]]
+    return prefix, filenames
+
+def decode_images(path, filenames, images=None):
+    # decodes the images from the directory or zip archive into images or a new array, uint8 for 8-bit images
+    archive = zipfile.ZipFile(path) if is_archive(path) else None
+    try:
+        prefix = list_archive(archive)[0] if archive is not None else None
+        for i, filename in enumerate(filenames):
+            if archive is not None:
+                image = Image.open(io.BytesIO(archive.read(prefix + filename)))
+            else:
+                image = Image.open(os.path.join(path, filename))
+            image = np.asarray(image).reshape(-1)
+            if images is None:
+                images = np.empty((len(filenames), image.size), dtype=image.dtype)
+            images[i] = image
+    finally:
+        if archive is not None:
+            archive.close()
+    return images
 
-            image_path = os.path.join(directory, filename)
-            image = np.array(Image.open(image_path)).astype(int).flatten()
+def read_images(path, filenames, workers=None):
+    # decodes the images in worker processes into one preallocated array in the order of filenames,
+    # at most two tasks per worker are waiting at once
+    workers = workers or os.cpu_count()
+    if workers == 1 or len(filenames) <= DECODE_CHUNK_SIZE:
+        return decode_images(path, filenames)
+    first_image = decode_images(path, filenames[:1])
+    images = np.empty((len(filenames), first_image.shape[1]), dtype=first_image.dtype)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = {}
+        for start in range(0, len(filenames), DECODE_CHUNK_SIZE):
+            if len(pending) >= 2 * workers:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    images[pending.pop(future)] = future.result()
+            end = min(start + DECODE_CHUNK_SIZE, len(filenames))
+            pending[executor.submit(decode_images, path, filenames[start:end])] = slice(start, end)
+        for future, chunk in pending.items():
+            images[chunk] = future.result()
+    return images
 
-            images.append(image)
-            labels.append(label)
+def read_truth(path):
+    # returns array of filenames and labels in the order of truth.dsv in the directory or zip archive
+    if is_archive(path):
+        with zipfile.ZipFile(path) as archive:
+            prefix = list_archive(archive)[0]
+            with io.TextIOWrapper(archive.open(prefix + 'truth.dsv'), newline='') as file:
+                return np.array([row[:2] for row in csv.reader(file, delimiter=':')])
+    with open(os.path.join(path, 'truth.dsv'), 'r') as file:
+        reader = csv.reader(file, delimiter=':')
+        return np.array([row[:2] for row in reader])
+
+def list_images(path):
+    # returns names of all files in the directory or zip archive except truth.dsv
+    if is_archive(path):
+        with zipfile.ZipFile(path) as archive:
+            filenames = list_archive(archive)[1]
+    else:
+        filenames = os.listdir(path)
+    return np.array([filename for filename in filenames if filename != 'truth.dsv'])
 
-    images = np.array(images)
-    labels = np.array(labels)
+def load_train_dataset(directory, cache_dir=CACHE_DIR):
+    prefix = get_cache_prefix(directory, 'train', cache_dir) if cache_dir is not None else None
+    cached = load_dataset_cache(prefix) if prefix is not None else None
+    if cached is not None:
+        images, names = cached
+        labels = names[:, 1]
+    else:
+        names = read_truth(directory)     # filename and label of every image
+        images = read_images(directory, names[:, 0])
+        labels = names[:, 1]
+        if prefix is not None:
+            save_dataset_cache(prefix, images, names)
 
     if all(label.isdigit() for label in labels):
         label_map = {str(digit): digit for digit in range(10)}
@@ -55,24 +165,20 @@ def load_train_dataset(directory):
     labels = np.array([label_map[label] for label in labels])
     return images, labels, reverse_label_map
 
-def load_test_dataset(directory):
-    images = []
-    filenames = []
-
-    for filename in os.listdir(directory):
-        image_path = os.path.join(directory, filename)
-        image = np.array(Image.open(image_path)).astype(int).flatten()
-
-        images.append(image)
-        filenames.append(filename)
-
-    images = np.array(images)
-    filenames = np.array(filenames)
+def load_test_dataset(directory, cache_dir=CACHE_DIR):
+    prefix = get_cache_prefix(directory, 'test', cache_dir) if cache_dir is not None else None
+    cached = load_dataset_cache(prefix) if prefix is not None else None
+    if cached is not None:
+        return cached
 
+    filenames = list_images(directory)
+    images = read_images(directory, filenames)
+    if prefix is not None:
+        save_dataset_cache(prefix, images, filenames)
     return images, filenames
 
 def calculate_distance(image1, image2):
-    diff = image1 - image2
+    diff = image1.astype(int) - image2
     distance = np.sqrt(np.sum(np.square(diff)))
     return distance
 
@@ -83,16 +189,142 @@ def knn_classifier(images_train, labels_train, k, test_sample):
     predicted_label = np.argmax(np.bincount(nearest_labels))
     return predicted_label
 
-def recognize_character(train_directory, test_directory, k, output_file):
+def calculate_squared_distances(images_test, images_train, train_norms=None):
+    # |a - b|^2 = |a|^2 + |b|^2 - 2ab, pixel values are small integers, so float64 sums are exact
+    images_test = images_test.astype(np.float64)
+    images_train = images_train.astype(np.float64)
+    if train_norms is None:
+        train_norms = np.einsum('ij,ij->i', images_train, images_train)
+    test_norms = np.einsum('ij,ij->i', images_test, images_test)
+    distances = test_norms[:, None] + train_norms[None, :] - 2 * (images_test @ images_train.T)
+    return np.maximum(distances, 0)
+
+def select_nearest(distances, k):
+    # the same neighbours as np.argsort(distances)[:k] of knn_classifier
+    if k >= distances.shape[1]:
+        return np.argsort(np.sqrt(distances), axis=1)
+    nearest_indices = np.argpartition(distances, k - 1, axis=1)[:, :k]
+    kth_distances = np.take_along_axis(distances, nearest_indices, axis=1).max(axis=1)
+    ties = np.count_nonzero(distances <= kth_distances[:, None], axis=1) > k
+    for i in np.flatnonzero(ties):
+        # more neighbours in the same distance as the k-th one, let argsort choose them like before
+        nearest_indices[i] = np.argsort(np.sqrt(distances[i]))[:k]
+    return nearest_indices
+
+def vote(nearest_labels, num_labels):
+    # the most frequent label of every row, the lowest one of equally frequent labels like np.bincount
+    counts = np.zeros((len(nearest_labels), num_labels), dtype=int)
+    np.add.at(counts, (np.arange(len(nearest_labels))[:, None], nearest_labels), 1)
+    return np.argmax(counts, axis=1)
+
+def knn_classify_batch(images_train, labels_train, k, images_test, chunk_size=CHUNK_SIZE):
+    images_train = images_train.astype(np.float64)
+    train_norms = np.einsum('ij,ij->i', images_train, images_train)
+    num_labels = labels_train.max() + 1
+    predicted_labels = np.empty(len(images_test), dtype=labels_train.dtype)
+    for start in range(0, len(images_test), chunk_size):
+        distances = calculate_squared_distances(images_test[start:start + chunk_size], images_train, train_norms)
+        nearest_labels = labels_train[select_nearest(distances, k)]
+        predicted_labels[start:start + chunk_size] = vote(nearest_labels, num_labels)
+    return predicted_labels
+
+class PCAIndex:
+    '''
+    Exact neighbour search pruned by PCA. The distance of two images is at least the distance of their
+    projections to the principal components, so only training images whose projection is closer than
+    the k-th nearest of a few candidates need their full distance computed.
+    '''
+
+    def __init__(self, images_train, num_components=PCA_COMPONENTS):
+        self.images = images_train.astype(np.float64)
+        self.norms = np.einsum('ij,ij->i', self.images, self.images)
+        self.mean = self.images.mean(axis=0)
+        centered = self.images - self.mean
+        _, _, components = np.linalg.svd(centered, full_matrices=False)
+        self.components = components[:num_components]
+        self.projections = centered @ self.components.T
+        self.projection_norms = np.einsum('ij,ij->i', self.projections, self.projections)
+        self.computed = 0   # number of computed full distances
+
+    def get_distances(self, image, indices):
+        distances = self.norms[indices] + image @ image - 2 * (self.images[indices] @ image)
+        self.computed += len(distances)
+        return np.maximum(distances, 0)
+
+    def query(self, images_test, k, chunk_size=CHUNK_SIZE):
+        # returns indices of the k nearest training images of every test image, the same as select_nearest
+        num_train = len(self.images)
+        nearest_indices = np.empty((len(images_test), min(k, num_train)), dtype=np.int64)
+        for start in range(0, len(images_test), chunk_size):
+            images = images_test[start:start + chunk_size].astype(np.float64)
+            projections = (images - self.mean) @ self.components.T
+            bounds = (np.einsum('ij,ij->i', projections, projections)[:, None] + self.projection_norms[None, :]
+                      - 2 * (projections @ self.projections.T))
+            num_candidates = min(num_train, max(2 * k, PCA_CANDIDATES))
+            candidates = np.argpartition(bounds, num_candidates - 1, axis=1)[:, :num_candidates]
+            for i, image in enumerate(images):
+                if k >= num_train:
+                    nearest_indices[start + i] = select_nearest(self.get_distances(image, slice(None))[None], k)[0]
+                    continue
+                distances = self.get_distances(image, candidates[i])
+                threshold = np.partition(distances, k - 1)[k - 1]
+                # projections lose a little precision, the bound is loosened not to skip any neighbour
+                indices = np.flatnonzero(bounds[i] <= threshold * (1 + 1e-9) + 1e-6)
+                distances = self.get_distances(image, indices)
+                kth_distance = np.partition(distances, k - 1)[k - 1]
+                if np.count_nonzero(distances <= kth_distance) > k:
+                    # ties in the distance of the k-th neighbour are resolved by argsort of all distances
+                    nearest_indices[start + i] = select_nearest(self.get_distances(image, slice(None))[None], k)[0]
+                else:
+                    nearest_indices[start + i] = indices[np.argpartition(distances, k - 1)[:k]]
+        return nearest_indices
+
+def knn_classify_indexed(index, labels_train, k, images_test):
+    return vote(labels_train[index.query(images_test, k)], labels_train.max() + 1)
+
+def choose_k(images_train, labels_train, max_k=MAX_K, chunk_size=CHUNK_SIZE):
+    # leave-one-out cross-validation of all k from 1 to max_k at once: every training image is classified
+    # by its nearest other training images, the neighbours are ranked only once for the largest k
+    # and votes of smaller k are their prefixes
+    num_train = len(images_train)
+    max_k = min(max_k, num_train - 1)
+    if max_k < 1:
+        return 1, np.zeros(0)
+    images = images_train.astype(np.float64)
+    norms = np.einsum('ij,ij->i', images, images)
+    rankings = np.empty((num_train, max_k), dtype=np.int64)
+    for start in range(0, num_train, chunk_size):
+        distances = calculate_squared_distances(images[start:start + chunk_size], images, norms)
+        rows = np.arange(len(distances))
+        distances[rows, start + rows] = np.inf      # the image itself is left out
+        nearest = np.argpartition(distances, max_k - 1, axis=1)[:, :max_k]
+        order = np.argsort(np.take_along_axis(distances, nearest, axis=1), axis=1, kind='stable')
+        rankings[start:start + chunk_size] = np.take_along_axis(nearest, order, axis=1)
+
+    counts = np.zeros((num_train, labels_train.max() + 1), dtype=int)
+    rows = np.arange(num_train)
+    accuracies = np.empty(max_k)
+    for k in range(1, max_k + 1):
+        counts[rows, labels_train[rankings[:, k - 1]]] += 1
+        accuracies[k - 1] = np.mean(np.argmax(counts, axis=1) == labels_train)
+    return int(np.argmax(accuracies)) + 1, accuracies
+
+def recognize_character(train_directory, test_directory, k, output_file, search='brute'):
     images_train, labels_train, reverse_label_map = load_train_dataset(train_directory)
     images_test, test_filenames = load_test_dataset(test_directory)
+    if k == 0:
+        k, accuracies = choose_k(images_train, labels_train)
+        if len(accuracies) > 0:
+            print('k = %d chosen by leave-one-out accuracy %.3f' % (k, accuracies[k - 1]))
+    if search == 'pca':
+        index = PCAIndex(images_train)
+        predicted_labels = knn_classify_indexed(index, labels_train, k, images_test)
+    else:
+        predicted_labels = knn_classify_batch(images_train, labels_train, k, images_test)
 
     with open(output_file, 'w') as file:
         writer = csv.writer(file, delimiter=':')
-        for i in range(len(images_test)):
-            test_image = images_test[i]
-            test_filename = test_filenames[i]
-            predicted_label = knn_classifier(images_train, labels_train, k, test_image)
+        for test_filename, predicted_label in zip(test_filenames, predicted_labels):
             predicted_label = reverse_label_map[predicted_label]
             writer.writerow([test_filename, predicted_label]) 
 
@@ -102,11 +334,9 @@ def main():
     train_directory = args.train_path
     test_directory = args.test_path
     k = args.k
-    if k == 0:
-        k = 4
     output_file = args.o
     
-    recognize_character(train_directory, test_directory, k, output_file)    
+    recognize_character(train_directory, test_directory, k, output_file, args.search)    
 
         
 if __name__ == "__main__":